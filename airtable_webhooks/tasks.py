@@ -8,12 +8,16 @@ from django.db import IntegrityError
 from django.utils import timezone
 from httpx import HTTPStatusError
 
-from drivers import AirTableDriver, SlackDriver
+from drivers import AirTableDriver, SlackDriver, airtable_rate_governor
 from server.celery import app
 from services.api.clients import AirTableWebHooksClient
+from services.rate_limiter import RateLimitExceeded
+from services.snapshots import AirTableSnapshots
+from services.write_ledger import AirTableWriteLedger
 from services.utils import import_model
 
 from airtable_webhooks.models import AirTableWebHook
+from leadgen_management.models import Projects
 from airtable_webhooks.utils import build_model_dict
 
 
@@ -22,7 +26,8 @@ logger = logging.getLogger('airtable_webhooks')
 
 @app.task
 def create_webhooks(notification_url: str):
-    client = AirTableWebHooksClient(base_id=settings.LEADGEN_DEV_BASE_ID, oauth_token=settings.LEADGEN_DEV_TOKEN)
+    client = AirTableWebHooksClient(base_id=settings.LEADGEN_DEV_BASE_ID, oauth_token=settings.LEADGEN_DEV_TOKEN,
+                                    rate_governor=airtable_rate_governor())
 
     for table_name, table_setups in settings.AIRTABLE_WEBHOOKS_TABLES_SETTINGS.items():
         if AirTableWebHook.objects.filter(table_name=table_name).exists():
@@ -124,10 +129,23 @@ def payload_handler(table_name: str, payload: dict):
     if not changed_tables:
         return
 
+    # the next read of the table builds a fresh snapshot
+    AirTableSnapshots().invalidate(table_name)
+
     changed_tables = payload.get('changedTablesById', {})
     changes_meta = changed_tables.get(table_id)
     changes_records_meta = changes_meta.get('changedRecordsById', {})
-    saved_records_ids = [] if not changes_records_meta else model.objects.all().values_list('air_id', flat=True)
+    destroyed_records_ids = changes_meta.get('destroyedRecordIds', [])
+
+    # pushed values of the changed records can not be trusted any more
+    write_ledger = AirTableWriteLedger(table_name)
+    write_ledger.forget(list(changes_records_meta) + destroyed_records_ids)
+    if destroyed_records_ids and any(field.name == 'url' for field in model._meta.concrete_fields):
+        # created records are keyed by URL, deleted ones can be created again
+        write_ledger.forget(model.objects.filter(air_id__in=destroyed_records_ids).values_list('url', flat=True))
+    saved_objs = {
+        obj.air_id: obj for obj in model.objects.filter(air_id__in=changes_records_meta.keys())
+    } if changes_records_meta else {}
     updated_fields = set()
 
     for record_id, update_meta in changes_records_meta.items():
@@ -142,8 +160,8 @@ def payload_handler(table_name: str, payload: dict):
 
                 update_kwargs = build_model_dict(cell_values, table_name, table_schema, model_fields)
 
-                if record_id in saved_records_ids and update_kwargs:
-                    obj = model.objects.get(air_id=record_id)
+                if record_id in saved_objs and update_kwargs:
+                    obj = saved_objs[record_id]
                     updated = False
 
                     for field, value in update_kwargs.items():
@@ -155,8 +173,11 @@ def payload_handler(table_name: str, payload: dict):
                     if updated:
                         update_objs.append(obj)
 
-                elif record_id not in saved_records_ids and update_kwargs:
-                    future_objs.append(model(air_id=record_id, **update_kwargs))
+                elif record_id not in saved_objs and update_kwargs:
+                    obj = model(air_id=record_id, **update_kwargs)
+                    if model is Projects:
+                        obj.fill_fingerprint()
+                    future_objs.append(obj)
 
         break
 
@@ -173,12 +194,16 @@ def payload_handler(table_name: str, payload: dict):
             logger.error(e)
 
 
-@app.task
-def extract_and_process_payloads(base_id, webhook_id, cursor, table_name):
-    client = AirTableWebHooksClient(base_id=base_id, oauth_token=settings.LEADGEN_DEV_TOKEN)
+@app.task(bind=True, max_retries=settings.MAX_RETRIES)
+def extract_and_process_payloads(self, base_id, webhook_id, cursor, table_name):
+    client = AirTableWebHooksClient(base_id=base_id, oauth_token=settings.LEADGEN_DEV_TOKEN,
+                                    rate_governor=airtable_rate_governor())
     try:
         # when accessing this resource, the token is updated for 7 days
         response_data = client.webhook_payloads(webhook_id=webhook_id, cursor=cursor)
+    except RateLimitExceeded as ex:
+        # the base is throttled, the same cursor is read again when the governor allows
+        raise self.retry(exc=ex, countdown=ex.retry_after)
     except HTTPStatusError as request_err:
         message = 'Error request for getting details of webhook %s' % webhook_id
         body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
@@ -0,0 +1,48 @@
+"""
+Throughput of short DB tasks with and without persistent connections.
+Every simulated task runs one small query between the same close_old_connections() calls
+Celery does around every task, so CONN_MAX_AGE=0 reconnects per task exactly like the workers did before.
+
+Run from the project root against the database from POSTGRES_DB_CONNECTION_URL:
+    python -m benchmarks.db_connection_benchmark [tasks]
+"""
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.db import connection, close_old_connections  # noqa: E402
+
+from leadgen_management.models import Proposals  # noqa: E402
+
+
+def short_task():
+    close_old_connections()
+    Proposals.objects.filter(pk=1).exists()
+    close_old_connections()
+
+
+def run(tasks: int = 500):
+    configured_max_age = connection.settings_dict['CONN_MAX_AGE']
+
+    for conn_max_age in (0, configured_max_age):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+        started_at = time.perf_counter()
+        for _ in range(tasks):
+            short_task()
+        elapsed = time.perf_counter() - started_at
+
+        print(f'CONN_MAX_AGE={conn_max_age!s:<6} {tasks} tasks {elapsed:7.3f} s  {tasks / elapsed:9.1f} tasks/s')
+
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = configured_max_age
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,87 @@
+"""
+EXPLAIN plans of the hot Proposals/Projects queries, for comparing them before and after the indexes migration.
+
+Run from the project root against the database from POSTGRES_DB_CONNECTION_URL:
+    python -m benchmarks.explain_hot_queries [--analyze] > plans_before.txt
+    python manage.py migrate
+    python -m benchmarks.explain_hot_queries [--analyze] > plans_after.txt
+    diff plans_before.txt plans_after.txt
+"""
+import os
+import sys
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.db import DatabaseError  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from leadgen_management.models import Projects, Proposals  # noqa: E402
+
+
+def sample_values(queryset, field: str, count: int = 50) -> list:
+    return list(queryset.exclude(**{'%s__isnull' % field: True}).values_list(field, flat=True)[:count])
+
+
+def week_ago_proposals(**date_filter):
+    return Proposals.objects.filter(
+        job_removed=False,
+        job_private=False,
+        invalid_url=False,
+        **date_filter
+    ).values_list('url', flat=True)
+
+
+def monthly_duplicates():
+    month_bucket = Projects.build_month_bucket(timezone.now())
+    return Projects.objects.filter(
+        month_bucket=month_bucket,
+        fingerprint__in=sample_values(Projects.objects.filter(month_bucket=month_bucket), 'fingerprint')
+    ).values_list('fingerprint', flat=True)
+
+
+def hot_queries() -> dict:
+    """
+    Querysets are built only when explained, so the shapes of the columns added by the migration
+    fail alone on the database before it, the baseline shapes are explained on both
+    """
+    today = timezone.now()
+    modified_before = today.replace(hour=0, minute=0, second=0, microsecond=0) - timezone.timedelta(days=6)
+
+    return {
+        'weekly_update_proposals baseline': lambda: week_ago_proposals(
+            modified_at__date__lte=(today - timezone.timedelta(days=7)).date()
+        ),
+        'weekly_update_proposals': lambda: week_ago_proposals(modified_at__lt=modified_before),
+        'update_proposals_on_airtable': lambda: Proposals.objects.filter(
+            air_id__in=sample_values(Proposals.objects.all(), 'air_id')
+        ).order_by('air_id').distinct('air_id'),
+        'proposals by air_id': lambda: Proposals.objects.filter(
+            air_id=next(iter(sample_values(Proposals.objects.all(), 'air_id', count=1)), '')
+        ),
+        'payload_handler projects': lambda: Projects.objects.filter(
+            air_id__in=sample_values(Projects.objects.all(), 'air_id')
+        ),
+        'projects monthly duplicates baseline': lambda: Projects.objects.filter(
+            created_at__date__month=today.month,
+            created_at__date__year=today.year
+        ),
+        'projects monthly duplicates': monthly_duplicates,
+    }
+
+
+def run(analyze: bool = False):
+    for name, build_queryset in hot_queries().items():
+        print(f'-- {name}')
+        try:
+            queryset = build_queryset()
+            print(queryset.explain(analyze=analyze) if analyze else queryset.explain())
+        except DatabaseError as ex:
+            print(f'failed: {ex}'.strip())
+        print()
+
+
+if __name__ == '__main__':
+    run(analyze='--analyze' in sys.argv[1:])
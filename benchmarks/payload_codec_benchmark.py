@@ -0,0 +1,52 @@
+"""
+Bytes stored and encode/decode time of the projects payload codecs on atom feed files.
+Projects are parsed by XmlScraper exactly as they are put into the projects stream.
+
+Run from the project root:
+    python -m benchmarks.payload_codec_benchmark feed.atom [feed.atom ...]
+"""
+import os
+import sys
+import json
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from services.codecs import CODECS, get_codec  # noqa: E402
+from leadgen_management.scrapers.xml_scraper import XmlScraper  # noqa: E402
+
+
+def load_projects(paths: list[str]) -> list[dict]:
+    xml_scraper = XmlScraper()
+    projects = []
+    for path in paths:
+        with open(path, 'rb') as feed:
+            feed_projects, _ = xml_scraper._get_projects_from_xml(data={'xml': feed.read(), 'keyword': path})
+        projects.extend(feed_projects)
+    return projects
+
+
+def run(paths: list[str], repeat: int = 5):
+    projects = load_projects(paths)
+    plain_size = sum(len(json.dumps(project)) for project in projects)
+    print(f'{len(projects)} projects from {len(paths)} feeds, plain json.dumps {plain_size} bytes, best of {repeat}')
+
+    for name in CODECS:
+        codec = get_codec(name)
+        encoded = [codec.encode(project) for project in projects]
+        size = sum(len(data) for data in encoded)
+        encode_time = min(timeit.repeat(lambda: [codec.encode(project) for project in projects], number=10,
+                                        repeat=repeat)) / 10
+        decode_time = min(timeit.repeat(lambda: [codec.decode(data) for data in encoded], number=10,
+                                        repeat=repeat)) / 10
+        print(f'{name:<14} {size:>10} bytes ({size / plain_size:6.1%})  '
+              f'encode {encode_time * 1000:8.3f} ms  decode {decode_time * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    run(sys.argv[1:])
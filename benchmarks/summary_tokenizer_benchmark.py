@@ -0,0 +1,129 @@
+"""
+Micro-benchmark of SummaryTokenizer against the previous find/slice summary helpers,
+with the check that both give the same project fields.
+
+Run from the project root, on the synthetic feed or on real atom feeds:
+    python -m benchmarks.summary_tokenizer_benchmark [feed.atom ...]
+"""
+import os
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from leadgen_management.scrapers.summary_tokenizer import SummaryTokenizer  # noqa: E402
+from leadgen_management.scrapers.xml_scraper import XmlScraper  # noqa: E402
+
+
+SUMMARY_TAGS = {
+    "hourly_range": "<b>Hourly Range</b>",
+    "budget": "<b>Budget</b>",
+    "posted_on": "<b>Posted On</b>",
+    "category": "<b>Category</b>",
+    "skills": "<b>Skills</b>",
+}
+FIELDS_TO_REPLACE = ("<b>Category</b>: ", "<b>Category</b>:", "<b>Country</b>: ", "<b>Country</b>:")
+COMPARED_FIELDS = ('description', 'project_type', 'hourly_range', 'budget', 'category', 'country')
+SUMMARY = (
+    'We need a developer &amp; designer for &quot;Leadgen&quot;.<br /><br />Details &middot; more text. ' * 10
+    + '<br /><br /><b>Hourly Range</b>: $15.00-$35.00\n<br /><b>Posted On</b>: March 20, 2023 12:34 UTC'
+    '<br /><b>Category</b>: Full Stack Development<br /><b>Skills</b>:Python,     Django     \n'
+    '<br /><b>Country</b>: United States\n<br /><a href="https://www.upwork.com/jobs/~01?source=rss">click to apply</a>'
+)
+
+
+def replace_fields(string_to_clean: str) -> str:
+    for field in FIELDS_TO_REPLACE:
+        string_to_clean = string_to_clean.replace(field, "")
+    return string_to_clean
+
+
+def legacy_parse_summary(summary: str) -> dict:
+    summary_dict = dict()
+    if SUMMARY_TAGS['hourly_range'] in summary:
+        payment_type = "hourly_range"
+    elif SUMMARY_TAGS['budget'] in summary:
+        payment_type = "budget"
+    else:
+        payment_type = None
+
+    stoping_field = payment_type or "posted_on"
+    summary_dict['description'] = summary[:summary.find(SUMMARY_TAGS[stoping_field])]
+    summary = summary[summary.find(SUMMARY_TAGS[stoping_field]):]
+
+    summary_dict['project_type'] = "hourly"
+    if payment_type:
+        summary_dict[payment_type] = summary[:summary.find(SUMMARY_TAGS['posted_on'])]
+        if payment_type == "budget":
+            summary_dict['project_type'] = "fixed"
+
+    summary_dict['category'] = replace_fields(summary[summary.find("<b>Category</b>"):summary.find("<b>Skills</b>")])
+    summary_dict['country'] = replace_fields(summary[summary.find("<b>Country</b>"):summary.find("<a href")])
+    return summary_dict
+
+
+def load_summaries(paths: list[str]) -> list[str]:
+    summaries = []
+    for path in paths:
+        with open(path, 'rb') as feed:
+            summaries.extend(
+                entry.findtext('{http://www.w3.org/2005/Atom}summary')
+                for entry in XmlScraper.iter_xml_entries(feed.read())
+            )
+    return summaries
+
+
+def normalize(value: str | None) -> str | None:
+    """ The legacy slices keep the label and the markup around the values, the text cleaner removes both """
+    if value is None:
+        return
+    value = value.split('</b>:', 1)[-1] if value.startswith('<b>') else value
+    return value.replace('<br />', '').strip() or None
+
+
+def check_equivalence(summaries: list[str]) -> int:
+    tokenizer = SummaryTokenizer(description_stop_labels=settings.SUMMARY_DESCRIPTION_STOP_LABELS)
+    mismatches = []
+    for summary in summaries:
+        legacy, record = legacy_parse_summary(summary), tokenizer.tokenize(summary)
+        for field in COMPARED_FIELDS:
+            if normalize(legacy.get(field)) != normalize(getattr(record, field)):
+                mismatches.append((field, legacy.get(field), getattr(record, field)))
+
+    print(f'{len(summaries)} summaries, {len(mismatches)} fields differ from the legacy helpers')
+    for field, expected, parsed in mismatches[:5]:
+        print(f'  {field}\n    legacy    {expected!r}\n    tokenizer {parsed!r}')
+    return len(mismatches)
+
+
+def tokenize_project_fields(tokenizer: SummaryTokenizer, summary: str) -> tuple:
+    """ Fields read by XmlScraper._build_project, Skills and Posted On are the ones the helpers did not give """
+    record = tokenizer.tokenize(summary)
+    return (record.description, record.budget, record.hourly_range, record.category, record.country,
+            record.project_type, record.skills, record.posted_on)
+
+
+def run(summaries: list[str], repeat: int = 7):
+    tokenizer = SummaryTokenizer(description_stop_labels=settings.SUMMARY_DESCRIPTION_STOP_LABELS)
+    cases = {
+        'legacy helpers': lambda: [legacy_parse_summary(summary) for summary in summaries],
+        'SummaryTokenizer': lambda: [tokenizer.tokenize(summary) for summary in summaries],
+        'tokenizer, all fields': lambda: [tokenize_project_fields(tokenizer, summary) for summary in summaries],
+    }
+
+    print(f'{len(summaries)} summaries, best of {repeat}')
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=50, repeat=repeat)) / 50
+        print(f'{name:<24} {best * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    feed_summaries = load_summaries(sys.argv[1:]) if len(sys.argv) > 1 else [SUMMARY] * 50
+    mismatches_count = check_equivalence(feed_summaries)
+    run(feed_summaries)
+    sys.exit(1 if mismatches_count else 0)
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of TextCleaner against the previous per-symbol re.sub implementation,
+with the check that the single pass cleans exactly like one re.sub pass per symbol.
+
+Run from the project root, on the synthetic feed or on the texts of real atom feeds:
+    python -m benchmarks.text_cleaner_benchmark [feed.atom ...]
+"""
+import os
+import re
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from converters.text_cleaner import TextCleaner  # noqa: E402
+from leadgen_management.scrapers.xml_scraper import XmlScraper  # noqa: E402
+
+
+SYMBOLS_TO_CLEAN = settings.TEXT_TO_CLEAN['projects']['xml_symbols_to_clean']
+ENTRY_FIELDS = (
+    'Senior Python developer for a scraping project - Upwork',
+    ('We need a developer &amp; designer for &quot;Leadgen&quot;.<br /><br />Details &middot; more text. ' * 20),
+    '<b>Category</b>: Full Stack Development<br />',
+    '<b>Country</b>: United States\n<br />',
+    'Requirements:\n&middot; Python\n&middot; Django',
+)
+
+
+def legacy_clear_string(string_to_clean: str, symbols_to_clean: tuple):
+    if string_to_clean:
+        for symbol in symbols_to_clean:
+            re_filter = re.compile(symbol)
+            if symbol == "<br /><br />":
+                string_to_clean = re.sub(re_filter, r'\n', string_to_clean)
+            elif symbol == 'quot;':
+                string_to_clean = re.sub(re_filter, '"', string_to_clean)
+            else:
+                string_to_clean = re.sub(re_filter, '', string_to_clean)
+        return string_to_clean
+
+
+def sequential_clear_string(string_to_clean: str, symbols_to_clean: tuple):
+    """ Reference semantics: one re.sub pass per symbol in order, with the TextCleaner replacements """
+    if string_to_clean:
+        for symbol in symbols_to_clean:
+            string_to_clean = re.sub(symbol, TextCleaner.replacements.get(symbol, '').replace('\\', r'\\'),
+                                     string_to_clean)
+        return string_to_clean
+
+
+def load_texts(paths: list[str]) -> list[str]:
+    """ Titles and summary fields of the real feeds, as they are passed to the cleaner """
+    xml_scraper = XmlScraper()
+    texts = []
+    for path in paths:
+        with open(path, 'rb') as feed:
+            for entry in xml_scraper.iter_xml_entries(feed.read()):
+                summary_record = xml_scraper.parse_summary(entry.find('{http://www.w3.org/2005/Atom}summary').text)
+                texts.extend((
+                    entry.find('{http://www.w3.org/2005/Atom}title').text,
+                    summary_record.description,
+                    summary_record.category,
+                    summary_record.country
+                ))
+    return texts
+
+
+def check_equivalence(texts: list[str]) -> int:
+    mismatches = [
+        (text, expected, cleaned)
+        for text, expected, cleaned in zip(
+            texts,
+            (sequential_clear_string(text, SYMBOLS_TO_CLEAN) for text in texts),
+            TextCleaner.clean_many(texts, SYMBOLS_TO_CLEAN)
+        )
+        if expected != cleaned
+    ]
+    print(f'{len(texts)} texts, {len(mismatches)} differ from the sequential passes')
+    for text, expected, cleaned in mismatches[:5]:
+        print(f'  {text!r}\n    sequential {expected!r}\n    single     {cleaned!r}')
+    return len(mismatches)
+
+
+def run(texts: list[str], repeat: int = 5):
+    cases = {
+        'legacy clear_string': lambda: [legacy_clear_string(text, SYMBOLS_TO_CLEAN) for text in texts],
+        'compiled clear_string': lambda: [TextCleaner.clear_string(text, SYMBOLS_TO_CLEAN) for text in texts],
+        'compiled clean_many': lambda: TextCleaner.clean_many(texts, SYMBOLS_TO_CLEAN),
+    }
+
+    print(f'{len(texts)} texts, best of {repeat}')
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=10, repeat=repeat)) / 10
+        print(f'{name:<24} {best * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    feed_texts = load_texts(sys.argv[1:]) if len(sys.argv) > 1 else list(ENTRY_FIELDS * 100)
+    mismatches_count = check_equivalence(feed_texts)
+    run(feed_texts)
+    sys.exit(1 if mismatches_count else 0)
@@ -1,24 +1,61 @@
 import re
-from typing import Optional
+from typing import Iterable, Optional
+
+
+class CompiledCleaner:
+
+    """ Single pass cleaner: all symbols are joined into one alternation, replacement is taken by matched text """
+
+    def __init__(self, symbols_to_clean: tuple, replacements: dict):
+        self.symbols_to_clean = symbols_to_clean
+        # non-capturing groups keep the alternation on the fast path of the regex engine
+        self.pattern = re.compile('|'.join('(?:%s)' % symbol for symbol in symbols_to_clean))
+        self.replacements = {symbol: value for symbol, value in replacements.items() if symbol in symbols_to_clean}
+
+    def _replace(self, match: re.Match) -> str:
+        return self.replacements.get(match.group(), '')
+
+    def clean(self, string_to_clean: str) -> Optional[str]:
+        if string_to_clean:
+            if not self.replacements:
+                return self.pattern.sub('', string_to_clean)
+            return self.pattern.sub(self._replace, string_to_clean)
+
+    def clean_many(self, strings_to_clean: Iterable[str]) -> list[Optional[str]]:
+        return [self.clean(string_to_clean) for string_to_clean in strings_to_clean]
 
 
 class TextCleaner:
 
     """ Clearing strings from unwanted symbols """
 
+    # replacements are matched by text, so only literal symbols can be replaced by something except empty string
+    replacements = {
+        "<br /><br />": "\n",
+        "&quot;": '"',
+        "quot;": '"',
+    }
+    _compiled_cleaners: dict[tuple, CompiledCleaner] = {}
+
+    @classmethod
+    def compiled_cleaner(cls, symbols_to_clean: tuple) -> CompiledCleaner:
+        """ Building the cleaner once per symbols tuple """
+        symbols_to_clean = tuple(symbols_to_clean)
+        cleaner = cls._compiled_cleaners.get(symbols_to_clean)
+        if cleaner is None:
+            cleaner = CompiledCleaner(symbols_to_clean=symbols_to_clean, replacements=cls.replacements)
+            cls._compiled_cleaners[symbols_to_clean] = cleaner
+        return cleaner
+
     @staticmethod
     def clear_string(string_to_clean: str, symbols_to_clean: tuple) -> Optional[str]:
         """ Removing unwanted symbols from string """
-        if string_to_clean:
-            for symbol in symbols_to_clean:
-                re_filter = re.compile(symbol)
-                if symbol == "<br /><br />":
-                    string_to_clean = re.sub(re_filter, r'\n', string_to_clean)
-                elif symbol == 'quot;':
-                    string_to_clean = re.sub(re_filter, '"', string_to_clean)
-                else:
-                    string_to_clean = re.sub(re_filter, '', string_to_clean)
-            return string_to_clean
+        return TextCleaner.compiled_cleaner(symbols_to_clean).clean(string_to_clean)
+
+    @staticmethod
+    def clean_many(strings_to_clean: Iterable[str], symbols_to_clean: tuple) -> list[Optional[str]]:
+        """ Removing unwanted symbols from every string of the batch """
+        return TextCleaner.compiled_cleaner(symbols_to_clean).clean_many(strings_to_clean)
 
     @staticmethod
     def get_number_from_string(string_to_parse: Optional[str]) -> Optional[float]:
@@ -2,13 +2,19 @@ import json
 import logging
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
 from django.conf import settings
 from django.utils import timezone
+from django_redis import get_redis_connection
 from slack_sdk import WebClient
 
 from converters.time_converter import TimeConverter
-from services.api.clients import AirTableClient
+from services.api.clients import AirTableClient, AirTableRateGovernor
+from services.rate_limiter import RedisTokenBucket, RateLimitExceeded
+from services.snapshots import AirTableSnapshots, SnapshotReadError
+from services.write_ledger import AirTableWriteLedger
 
 
 logger = logging.getLogger('leadgen_management')
@@ -19,27 +25,137 @@ def func_chunks_generators(lst, n):
         yield lst[i: i + n]
 
 
+def airtable_rate_governor() -> AirTableRateGovernor:
+    """ Rate governor of the Airtable bases shared by all workers """
+    return AirTableRateGovernor(
+        bucket=RedisTokenBucket(
+            redis=get_redis_connection(settings.AIRTABLE_SYNC_CACHE_NAME),
+            prefix='airtable_rate_limit',
+            rate=settings.AIRTABLE_RATE_LIMIT_PER_SECOND,
+            burst=settings.AIRTABLE_RATE_LIMIT_BURST,
+            min_rate=settings.AIRTABLE_RATE_LIMIT_MIN_PER_SECOND,
+            increase_step=settings.AIRTABLE_RATE_LIMIT_INCREASE_STEP,
+            decrease_factor=settings.AIRTABLE_RATE_LIMIT_DECREASE_FACTOR,
+            default_block=settings.AIRTABLE_RATE_LIMIT_DEFAULT_BLOCK
+        ),
+        read_reserve=settings.AIRTABLE_RATE_LIMIT_READ_RESERVE,
+        max_wait=settings.AIRTABLE_RATE_LIMIT_MAX_WAIT
+    )
+
+
+def retry_delay(ex: Exception, default: float = .3) -> float:
+    """ Seconds to wait before repeating the failed Airtable request, throttled requests wait as told """
+    return ex.retry_after if isinstance(ex, RateLimitExceeded) else default
+
+
 class AirTableDriver(TimeConverter):
     def __init__(self):
-        self.api = AirTableClient(settings.AIRTABLE_TOKEN)
+        self.api = AirTableClient(settings.AIRTABLE_TOKEN, rate_governor=airtable_rate_governor())
+        self.snapshots = AirTableSnapshots()
+
+    def get_records(self, table_name: str, max_retries: int = 3, raise_exception: bool = False,
+                    snapshot: bool = False, **kwargs) -> list:
+        try:
+            return [
+                record
+                for records in self.iter_pages(table_name, max_retries=max_retries, snapshot=snapshot, **kwargs)
+                for record in records
+            ]
+        except SnapshotReadError:
+            # a part of the snapshot is not an empty table
+            raise
+        except Exception:
+            if raise_exception:
+                raise
+        return []
 
-    def get_records(self, table_name: str, max_retries: int = 3, **kwargs) -> list:
+    def iter_pages(self, table_name: str, max_retries: int = 3, snapshot: bool = False,
+                   **kwargs) -> Iterator[list[dict]]:
+        """
+        Records page by page instead of the whole table in memory.
+        The next page is fetched in the background while the caller handles the current one.
+        With snapshot the whole table is read from the shared snapshot, which is built on the first read.
+        """
+        if not snapshot:
+            return self._iter_api_pages(table_name=table_name, max_retries=max_retries, **kwargs)
+
+        assert not kwargs, 'Snapshots are kept only for the whole tables'
+        return self.snapshots.iter_pages(
+            table_name=table_name,
+            fetch_pages=lambda: self._iter_api_pages(table_name=table_name, max_retries=max_retries)
+        )
+
+    def _iter_api_pages(self, table_name: str, max_retries: int, **kwargs) -> Iterator[list[dict]]:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(self._get_page, table_name, None, max_retries, **kwargs)
+            while next_page is not None:
+                data = next_page.result()
+                offset = data.get('offset')
+                next_page = None
+                if offset:
+                    next_page = executor.submit(self._get_page, table_name, offset, max_retries, **kwargs)
+                yield data.get('records', [])
+
+    def _get_page(self, table_name: str, offset: str | None, max_retries: int, **kwargs) -> dict:
         retries = 0
-        while retries < max_retries:
+        while True:
             try:
-                response = self.api.all(settings.AIRTABLE_BASE_ID, table_name, **kwargs)
-                return response
+                return self.api.page(settings.AIRTABLE_BASE_ID, table_name, offset=offset, **kwargs)
             except Exception as ex:
                 retries += 1
-                time.sleep(.5)
                 logger.error(f"Error while trying fetch records from AirTable. Retry {retries}. {ex}")
-        return []
+                if retries >= max_retries:
+                    raise
+                time.sleep(retry_delay(ex, default=.5))
 
     def create_many(self, table_name: str, records: list):
-        return self.api.batch_create(settings.AIRTABLE_BASE_ID, table_name, records)
+        try:
+            return self.api.batch_create(settings.AIRTABLE_BASE_ID, table_name, records)
+        finally:
+            self.snapshots.invalidate(table_name)
 
     def update_batch(self, table_name, **kwargs):
-        return self.api.batch_update(settings.AIRTABLE_BASE_ID, table_name, **kwargs)
+        try:
+            return self.api.batch_update(settings.AIRTABLE_BASE_ID, table_name, **kwargs)
+        finally:
+            self.snapshots.invalidate(table_name)
+
+    def update(self, table_name: str, record_id: str, fields: dict):
+        try:
+            return self.api.update(settings.AIRTABLE_BASE_ID, table_name, record_id, fields)
+        finally:
+            self.snapshots.invalidate(table_name)
+
+    def update_changed(self, table_name: str, records: dict[str, dict]) -> int:
+        """
+        Updating records {record id: fields} with only the fields changed since the last push,
+        in full batches, returns the number of the updated records
+        """
+        ledger = AirTableWriteLedger(table_name)
+        changed_records = ledger.diff(records)
+        for batch in func_chunks_generators(list(changed_records.items()), self.api.MAX_RECORDS_PER_REQUEST):
+            self.update_batch(
+                table_name,
+                records=[{'id': record_id, 'fields': fields} for record_id, fields in batch]
+            )
+            ledger.commit(dict(batch))
+        return len(changed_records)
+
+    def create_new(self, table_name: str, records: list[dict], key_field: str = 'URL') -> int:
+        """ Creating records which were not created before by their key_field, returns the number of created records """
+        ledger = AirTableWriteLedger(table_name)
+        new_records = ledger.new({record[key_field]: record for record in records})
+        for batch in func_chunks_generators(list(new_records.items()), self.api.MAX_RECORDS_PER_REQUEST):
+            created_records = self.create_many(table_name, [fields for _, fields in batch])
+            ledger.commit(
+                dict(batch),
+                record_ids={record['fields'].get(key_field): record['id'] for record in created_records}
+            )
+        return len(new_records)
+
+    def created_record_ids(self, table_name: str, keys: list[str]) -> dict[str, str]:
+        """ Airtable ids of the records created by create_new, by their key_field values """
+        return AirTableWriteLedger(table_name).record_ids(keys)
 
     def base_schema(self):
         return self.api.schema(settings.AIRTABLE_BASE_ID)
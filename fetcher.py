@@ -1,27 +1,180 @@
+import asyncio
+import random
+from urllib.parse import urlparse
+
 import httpx
 import time
 import logging
 
+from services.rate_limiter import parse_retry_after
+
 logger = logging.getLogger('leadgen_management')
 
 
 class Fetcher:
 
-    def get_xml(self, feed_url: str, keyword: str, max_retries: int = 3, headers: dict = None) -> dict:
-        response = self.get_http_response(url=feed_url, headers=headers, max_retries=max_retries)
-        if response.get("response"):
-            return {"xml": response['response'].text, "keyword": keyword}
-        else:
-            return response
+    # RedisTokenBucket shared by all workers, requests aren't limited when it is not set
+    rate_limiter = None
+    backoff_base = 0.5
+    backoff_cap = 30
 
-    @staticmethod
-    def get_http_response(url: str, headers: dict = None, max_retries: int = 3):
+    def get_xml(self, feed_url: str, keyword: str, max_retries: int = 3, headers: dict = None,
+                validators: dict = None) -> dict:
+        response = self.get_http_response(
+            url=feed_url,
+            headers=self.conditional_headers(headers=headers, validators=validators),
+            max_retries=max_retries
+        )
+        return self._xml_from_response(response=response, keyword=keyword)
+
+    def get_http_response(self, url: str, headers: dict = None, max_retries: int = 3):
+        host = urlparse(url).netloc
         retries = 0
         while retries < max_retries:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(host)
+
             response = httpx.get(url, headers=headers)
-            if response.status_code == 200:
+            if response.status_code in (200, 304):
+                self._request_succeeded(host)
                 return {"response": response}
+
             retries += 1
-            time.sleep(0.5)
+            delay = self._retry_delay(host=host, response=response, retries=retries)
+            if delay is None or retries >= max_retries:
+                break
+            time.sleep(delay)
         logger.error(f"[ERROR] status code {response.status_code}")
         return {"error": f"[ERROR] status code {response.status_code}"}
+
+    def get_many_xml(self, feeds: list[dict], max_retries: int = 3, headers: dict = None,
+                     concurrency: int = 20, timeout: float = 30) -> list[dict]:
+        """ Fetching all feeds in one pass through the shared pooled client, result has the same order as feeds """
+        return asyncio.run(
+            self._get_many_xml(
+                feeds=feeds,
+                max_retries=max_retries,
+                headers=headers,
+                concurrency=concurrency,
+                timeout=timeout
+            )
+        )
+
+    async def _get_many_xml(self, feeds: list[dict], max_retries: int, headers: dict | None,
+                            concurrency: int, timeout: float) -> list[dict]:
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(http2=True, headers=headers, limits=limits, timeout=timeout) as client:
+            return await asyncio.gather(
+                *(
+                    self._async_get_xml(
+                        client=client,
+                        semaphore=semaphore,
+                        feed_url=feed['feed_url'],
+                        keyword=feed['keyword'],
+                        validators=feed.get('validators'),
+                        max_retries=max_retries,
+                        timeout=timeout
+                    )
+                    for feed in feeds
+                )
+            )
+
+    async def _async_get_xml(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, feed_url: str,
+                             keyword: str, validators: dict | None, max_retries: int, timeout: float) -> dict:
+        async with semaphore:
+            response = await self._async_get_http_response(
+                client=client,
+                url=feed_url,
+                headers=self.conditional_headers(validators=validators),
+                max_retries=max_retries,
+                timeout=timeout
+            )
+
+        return self._xml_from_response(response=response, keyword=keyword)
+
+    async def _async_get_http_response(self, client: httpx.AsyncClient, url: str, headers: dict = None,
+                                       max_retries: int = 3, timeout: float = 30) -> dict:
+        """
+        The timeout bounds every HTTP call only, not the rate limiter and Retry-After waits,
+        the blocking Redis calls of the limiter run in threads so they don't stall the other feeds
+        """
+        host = urlparse(url).netloc
+        retries = 0
+        error = None
+        while retries < max_retries:
+            if self.rate_limiter:
+                await self.rate_limiter.async_acquire(host)
+
+            response = None
+            try:
+                response = await asyncio.wait_for(client.get(url, headers=headers), timeout=timeout)
+            except asyncio.TimeoutError:
+                error = f"[ERROR] timeout {timeout}s exceeded"
+            except httpx.HTTPError as ex:
+                error = f"[ERROR] {ex.__class__.__name__} {ex}"
+            else:
+                if response.status_code in (200, 304):
+                    await asyncio.to_thread(self._request_succeeded, host)
+                    return {"response": response}
+                error = f"[ERROR] status code {response.status_code}"
+
+            retries += 1
+            delay = await asyncio.to_thread(self._retry_delay, host=host, response=response, retries=retries)
+            if delay is None or retries >= max_retries:
+                break
+            await asyncio.sleep(delay)
+        logger.error(f"{error} {url}")
+        return {"error": error}
+
+    def _request_succeeded(self, host: str):
+        if self.rate_limiter:
+            self.rate_limiter.success(host)
+
+    def _retry_delay(self, host: str, response: httpx.Response | None, retries: int) -> float | None:
+        """ Seconds to wait before the next retry, None when the request shouldn't be retried """
+        backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** retries))
+        if response is None or response.status_code == 408:
+            return backoff
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if self.rate_limiter:
+                self.rate_limiter.penalize(host, retry_after=retry_after)
+
+            delay = retry_after if retry_after is not None else backoff
+            # waiting longer than the cap is the next cycle's job
+            return delay if delay <= self.backoff_cap else None
+        # other client errors won't be fixed by retrying
+        return None
+
+    def _xml_from_response(self, response: dict, keyword: str) -> dict:
+        if not response.get("response"):
+            response['keyword'] = keyword
+            return response
+
+        if response['response'].status_code == 304:
+            return {"not_modified": True, "keyword": keyword}
+
+        return {
+            "xml": response['response'].content,
+            "keyword": keyword,
+            "validators": self.response_validators(response['response'])
+        }
+
+    @staticmethod
+    def conditional_headers(headers: dict = None, validators: dict = None) -> dict:
+        """ Adding If-None-Match / If-Modified-Since to headers from saved validators of the previous response """
+        headers = dict(headers or {})
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    @staticmethod
+    def response_validators(response: httpx.Response) -> dict:
+        validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+        return {key: value for key, value in validators.items() if value}
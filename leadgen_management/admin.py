@@ -17,7 +17,8 @@ class ProjectAdmin(admin.ModelAdmin):
         'category',
         'budget',
         'hourly',
-        'leadgen_comment'
+        'leadgen_comment',
+        'matched_keywords'
     )
     search_help_text = "search by fields %s" % ', '.join(model_verbose_fields(Projects, search_fields))
     list_filter = (
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def schedule_projects_fingerprints_backfill(sender, using: str = 'default', **kwargs):
+    """ One-off beat task filling the fingerprints of the projects saved before the fields were added """
+    from django_celery_beat.models import IntervalSchedule, PeriodicTask
+
+    schedule, _ = IntervalSchedule.objects.using(using).get_or_create(every=1, period=IntervalSchedule.MINUTES)
+    PeriodicTask.objects.using(using).get_or_create(
+        name='Fill projects fingerprints',
+        defaults={
+            'task': 'leadgen_management.tasks.fill_projects_fingerprints',
+            'interval': schedule,
+            'one_off': True,
+        }
+    )
 
 
 class LeadgenManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'leadgen_management'
+
+    def ready(self):
+        post_migrate.connect(schedule_projects_fingerprints_backfill, sender=self)
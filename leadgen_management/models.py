@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.utils import timezone
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
@@ -28,7 +30,7 @@ class BaseModel(models.Model):
 class Projects(BaseModel):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
-    air_id = models.CharField(max_length=17, blank=True, null=True)
+    air_id = models.CharField(max_length=17, blank=True, null=True, db_index=True)
     shift = models.CharField(max_length=10, null=True)
     responsible = models.CharField(max_length=100, null=True, blank=True)
     proposal_added = models.DateTimeField(null=True, blank=True)
@@ -40,6 +42,7 @@ class Projects(BaseModel):
     missed = models.BooleanField(null=True, blank=True)
     comment_hol = models.TextField(null=True, blank=True)
     keyword = models.CharField(max_length=100, blank=True)
+    matched_keywords = models.TextField(null=True, blank=True)
     approved_by_hol = models.BooleanField(null=True, blank=True)
     approval_time = models.DateTimeField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
@@ -49,19 +52,39 @@ class Projects(BaseModel):
     hourly = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     leadgen_comment = models.TextField(null=True, blank=True)
     project_type = models.CharField(max_length=30, null=True)
+    fingerprint = models.CharField(max_length=40, null=True, blank=True)
+    month_bucket = models.CharField(max_length=7, null=True, blank=True)
 
     def __str__(self):
         return f"ID {self.id}"
 
+    @staticmethod
+    def build_fingerprint(title: str | None, country: str | None, project_type: str | None) -> str:
+        """ Hash of the normalized fields used for monthly duplicates detection """
+        normalized = '|'.join(' '.join(str(value or '').split()).casefold() for value in (title, country, project_type))
+        return hashlib.sha1(normalized.encode()).hexdigest()
+
+    @staticmethod
+    def build_month_bucket(date) -> str:
+        return date.strftime('%Y-%m')
+
+    def fill_fingerprint(self):
+        """ Duplicates detection fields of the rows inserted outside of save_projects_to_database """
+        self.fingerprint = self.build_fingerprint(self.title, self.country, self.project_type)
+        self.month_bucket = self.build_month_bucket(self.created_at)
+
     class Meta:
         verbose_name = 'Projects'
         verbose_name_plural = 'Projects'
+        indexes = [
+            models.Index(fields=('month_bucket', 'fingerprint'), name='projects_month_fingerprint_idx'),
+        ]
 
 
 class Proposals(BaseModel):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
-    air_id = models.CharField(max_length=17, blank=True, null=True)
+    air_id = models.CharField(max_length=17, blank=True, null=True, db_index=True)
     url = models.TextField(unique=True)
     proposal_date = models.DateField(null=True, blank=True)
     title = models.TextField(null=True, blank=True)
@@ -127,12 +150,20 @@ class Proposals(BaseModel):
     class Meta:
         verbose_name = 'Proposals'
         verbose_name_plural = 'Proposals'
+        indexes = [
+            # weekly_update_proposals looks only for the proposals which still can be scraped
+            models.Index(
+                fields=('modified_at',),
+                name='proposals_scrapable_mod_idx',
+                condition=models.Q(job_removed=False, job_private=False, invalid_url=False)
+            ),
+        ]
 
 
 class DeclinedInvites(BaseModel):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
-    air_id = models.CharField(max_length=17, blank=True, null=True)
+    air_id = models.CharField(max_length=17, blank=True, null=True, db_index=True)
     url = models.TextField(unique=True)
     title = models.TextField(null=True, blank=True)
     invites_date = models.DateField(null=True, blank=True)
@@ -154,7 +185,7 @@ class DeclinedInvites(BaseModel):
 class Leads(BaseModel):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
-    air_id = models.CharField(max_length=17, blank=True, null=True)
+    air_id = models.CharField(max_length=17, blank=True, null=True, db_index=True)
     _id = models.IntegerField()
     client_name = models.CharField(max_length=200, null=True, blank=True)
     project_title = models.TextField(null=True, blank=True)
@@ -0,0 +1,89 @@
+import re
+import logging
+import calendar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import cached_property
+
+
+logger = logging.getLogger('leadgen_management')
+
+
+@dataclass
+class SummaryRecord:
+
+    """ Description and the raw values of the summary labels, the values are looked up or parsed only on access """
+
+    description: str
+    fields: dict[str, str] = field(default_factory=dict, repr=False)
+
+    tags_pattern = re.compile(r'<[^>]*>')
+    # "March 20, 2023 12:34 UTC"
+    posted_on_pattern = re.compile(r'([A-Za-z]+) (\d{1,2}), (\d{4}) (\d{1,2}):(\d{2})')
+    months = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+    @property
+    def hourly_range(self) -> str | None:
+        return self.fields.get('Hourly Range')
+
+    @property
+    def budget(self) -> str | None:
+        return self.fields.get('Budget')
+
+    @property
+    def project_type(self) -> str:
+        return 'fixed' if 'Budget' in self.fields else 'hourly'
+
+    @property
+    def category(self) -> str | None:
+        return self.fields.get('Category')
+
+    @property
+    def country(self) -> str | None:
+        return self.fields.get('Country')
+
+    @cached_property
+    def posted_on(self) -> datetime | None:
+        value = self.fields.get('Posted On')
+        if value is None:
+            return
+
+        match = self.posted_on_pattern.search(value)
+        month = self.months.get(match.group(1)) if match else None
+        if not month:
+            logger.warning(f"Not supported Posted On format {value}")
+            return
+
+        _, day, year, hour, minute = match.groups()
+        return datetime(int(year), month, int(day), int(hour), int(minute), tzinfo=timezone.utc)
+
+    @cached_property
+    def skills(self) -> list[str]:
+        value = self.tags_pattern.sub('', self.fields.get('Skills', ''))
+        return [skill.strip() for skill in value.split(',') if skill.strip()]
+
+
+class SummaryTokenizer:
+
+    """
+    Splitting the summary html after the description by its `<b>Label</b>: value` pairs in one regex pass,
+    the description ends at the first of `description_stop_labels`
+    """
+
+    # "<b>Country</b>: United States" -> "Country", "United States"
+    label_pattern = re.compile(r'<b>([^<]{1,64})</b>: ?')
+
+    def __init__(self, description_stop_labels: tuple):
+        self.description_end_pattern = re.compile(
+            '<b>(?:%s)</b>:' % '|'.join(re.escape(label) for label in description_stop_labels)
+        )
+
+    def tokenize(self, summary: str) -> SummaryRecord:
+        description_end = self.description_end_pattern.search(summary)
+        if description_end is None:
+            return SummaryRecord(description=summary)
+
+        parts = self.label_pattern.split(summary[description_end.start():])
+        # the last value is followed by the apply link
+        parts[-1] = parts[-1].partition('<a href')[0]
+        return SummaryRecord(description=summary[:description_end.start()], fields=dict(zip(parts[1::2], parts[2::2])))
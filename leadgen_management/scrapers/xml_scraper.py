@@ -1,15 +1,22 @@
+import hashlib
+import json
 import logging
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Iterator, Optional
 from urllib.parse import urlparse
 from xml.etree import ElementTree
 
 from django.conf import settings
 from django.core.cache import caches
+from django_redis import get_redis_connection
 
 from drivers import SlackDriver
 from fetcher import Fetcher
 from converters.text_cleaner import TextCleaner
 from converters.time_converter import TimeConverter
+from services.rate_limiter import RedisTokenBucket
+from leadgen_management.utils import claim_cycle_url
+from leadgen_management.scrapers.summary_tokenizer import SummaryRecord, SummaryTokenizer
 
 
 logger = logging.getLogger('leadgen_management')
@@ -17,145 +24,238 @@ logger = logging.getLogger('leadgen_management')
 
 class XmlScraper(TimeConverter, TextCleaner, Fetcher):
 
-    def __init__(self, current_timezone: str = "Europe/Kiev"):
+    def __init__(self, current_timezone: str = "Europe/Kiev", cycle_id: str = None):
         self.timezone = current_timezone
+        self.cycle_id = cycle_id
+        self.pending_feeds_state = {}
         self.symbols_to_clean = settings.TEXT_TO_CLEAN['projects']['xml_symbols_to_clean']
-        self.fields_to_replace = settings.TEXT_TO_CLEAN['projects']['xml_fields_to_replace']
+        self.summary_tokenizer = SummaryTokenizer(description_stop_labels=settings.SUMMARY_DESCRIPTION_STOP_LABELS)
+        self.rate_limiter = RedisTokenBucket(
+            redis=get_redis_connection(settings.XML_FEEDS_CACHE_NAME),
+            prefix='xml_rate_limit',
+            rate=settings.XML_RATE_LIMIT_PER_SECOND,
+            burst=settings.XML_RATE_LIMIT_BURST,
+            min_rate=settings.XML_RATE_LIMIT_MIN_PER_SECOND,
+            increase_step=settings.XML_RATE_LIMIT_INCREASE_STEP,
+            decrease_factor=settings.XML_RATE_LIMIT_DECREASE_FACTOR,
+            default_block=settings.XML_RATE_LIMIT_DEFAULT_BLOCK
+        )
 
     def scrap_and_parse_projects(self, feed_url: str, keyword: str) -> list[dict] | None:
-        slack_driver = SlackDriver()
+        """ The feed state is saved by commit_feed_state() after the projects are handed off """
+        if not self._validate_feed_url(feed_url=feed_url, keyword=keyword):
+            return
+
+        data = self.get_xml(
+            max_retries=settings.MAX_RETRIES,
+            feed_url=feed_url,
+            keyword=keyword,
+            headers=settings.HEADERS,
+            validators=self._get_feed_validators(feed_url=feed_url)
+        )
+        return self._handle_xml_data(data=data, feed_url=feed_url, keyword=keyword)
+
+    def iter_scrap_and_parse_many(self, feeds: list[dict]) -> Iterator[tuple[str, list[dict] | None]]:
+        """
+        Yielding projects of every keyword as soon as its feed is parsed,
+        the feed state is saved when the consumer asks for the next feed, so after its projects are handed off
+        """
+        valid_feeds = [
+            dict(feed, validators=self._get_feed_validators(feed_url=feed['feed_url']))
+            for feed in feeds if self._validate_feed_url(feed_url=feed['feed_url'], keyword=feed['keyword'])
+        ]
+        if not valid_feeds:
+            return
+
+        many_data = self.get_many_xml(
+            feeds=valid_feeds,
+            max_retries=settings.MAX_RETRIES,
+            headers=settings.HEADERS,
+            concurrency=settings.XML_FETCH_CONCURRENCY,
+            timeout=settings.XML_FETCH_TIMEOUT
+        )
+        for feed, data in zip(valid_feeds, many_data):
+            yield feed['keyword'], self._handle_xml_data(data=data, feed_url=feed['feed_url'], keyword=feed['keyword'])
+            self.commit_feed_state(feed_url=feed['feed_url'])
+
+    @staticmethod
+    def _validate_feed_url(feed_url: str, keyword: str) -> bool:
         parsed_url = urlparse(feed_url)
 
         if not parsed_url.scheme or 'upwork.com' not in parsed_url.netloc:
             cache = caches[settings.PROJECTS_NOTIFICATION_CACHE]
-            slack_driver.save_notification_to_cache(
+            SlackDriver().save_notification_to_cache(
                 notification_cache=cache,
                 level='warning',
                 msg_header='Feed URL validation error',
                 message='<%s|%s>' % (feed_url, keyword)
             )
-            return
+            return False
 
         if not parsed_url.path.endswith('atom'):
             cache = caches[settings.PROJECTS_NOTIFICATION_CACHE]
-            slack_driver.save_notification_to_cache(
+            SlackDriver().save_notification_to_cache(
                 notification_cache=cache,
                 level='warning',
                 msg_header='This Feed URL\'s must contains `atom`',
                 message='<%s|%s>' % (feed_url, keyword)
             )
-            return
+            return False
+        return True
+
+    def _handle_xml_data(self, data: dict, feed_url: str, keyword: str) -> list[dict] | None:
+        if data.get('not_modified'):
+            logger.debug(f"Feed for keyword {keyword} not modified since the last scraping.")
+            return []
 
-        data = self.get_xml(
-            max_retries=settings.MAX_RETRIES,
-            feed_url=feed_url,
-            keyword=keyword,
-            headers=settings.HEADERS
-        )
         if data.get('xml'):
             try:
-                new_projects = self._get_projects_from_xml(data=data)
+                new_projects, watermark = self._get_projects_from_xml(
+                    data=data,
+                    watermark=self._get_feed_watermark(feed_url=feed_url)
+                )
+                # saved only after the projects are enqueued, a failed handoff reads the same entries again
+                self.pending_feeds_state[feed_url] = dict(validators=data.get('validators'), watermark=watermark)
                 return new_projects
             except Exception as ex:
                 logger.error(f"Error while trying to scrap xml. {ex}")
+        else:
+            logger.error(f"Http response error. {data.get('error')}")
 
-        logger.error(f"Http response error. {data['error']}")
         logger.error(f"ERROR while trying to fetch projects from atom url.")
 
         cache = caches[settings.PROJECTS_NOTIFICATION_CACHE]
-        slack_driver.save_notification_to_cache(
+        SlackDriver().save_notification_to_cache(
             notification_cache=cache,
             level='warning',
             msg_header='Something went wrong with getting data for keywords:',
             message='<%s|%s>' % (feed_url, keyword)
         )
 
-    def _get_projects_from_xml(self, data: dict) -> list[dict]:
-        xml_projects = list()
-        shift = self._get_shift()
-        tree = ElementTree.fromstring(data['xml'])
-
-        for entry in tree.findall('{http://www.w3.org/2005/Atom}entry'):
-            url = entry.find("{http://www.w3.org/2005/Atom}id").text
-            title = entry.find("{http://www.w3.org/2005/Atom}title").text
-            summary = entry.find("{http://www.w3.org/2005/Atom}summary").text
-            summary_dict = self.parse_summary(summary=summary)
-
-            project = dict(
-                shift=shift,
-                url=url,
-                title=self.clear_string(
-                    string_to_clean=title,
-                    symbols_to_clean=self.symbols_to_clean
-                ),
-                description=self.clear_string(
-                    string_to_clean=summary_dict['description'],
-                    symbols_to_clean=self.symbols_to_clean
-                ),
-                budget=self.get_number_from_string(
-                    string_to_parse=summary_dict.get('budget')
-                ),
-                hourly=self._parse_hourly_range(
-                    string_to_parse=summary_dict.get('hourly_range')
-                ),
-                category=self.clear_string(
-                    string_to_clean=summary_dict['category'],
-                    symbols_to_clean=self.symbols_to_clean
-                ),
-                country=self.clear_string(
-                    string_to_clean=summary_dict['country'],
-                    symbols_to_clean=self.symbols_to_clean
-                ),
-                project_type=summary_dict.get('project_type'),
-                keyword=data['keyword'],
-            )
-            xml_projects.append(project)
-        return xml_projects
+    def commit_feed_state(self, feed_url: str) -> None:
+        """ Saving the validators and the watermark of the handled feed """
+        feed_state = self.pending_feeds_state.pop(feed_url, None)
+        if feed_state:
+            self._save_feed_validators(feed_url=feed_url, validators=feed_state['validators'])
+            self._save_feed_watermark(feed_url=feed_url, watermark=feed_state['watermark'])
+
+    @staticmethod
+    def _feed_cache_key(prefix: str, feed_url: str) -> str:
+        return '%s_%s' % (prefix, hashlib.md5(feed_url.encode()).hexdigest())
 
-    def parse_summary(self, summary: str) -> dict:
+    def _get_feed_validators(self, feed_url: str) -> dict | None:
+        validators = caches[settings.XML_FEEDS_CACHE_NAME].get(self._feed_cache_key('feed_validators', feed_url))
+        if validators:
+            return json.loads(validators)
 
-        summary_dict = dict()
-        if settings.SUMMARY_TAGS['hourly_range'] in summary:
-            payment_type = "hourly_range"
-        elif settings.SUMMARY_TAGS['budget'] in summary:
-            payment_type = "budget"
+    def _save_feed_validators(self, feed_url: str, validators: dict | None) -> None:
+        cache = caches[settings.XML_FEEDS_CACHE_NAME]
+        if validators:
+            cache.set(self._feed_cache_key('feed_validators', feed_url), json.dumps(validators),
+                      timeout=settings.XML_FEED_VALIDATORS_TIMEOUT)
         else:
-            payment_type = None
+            cache.delete(self._feed_cache_key('feed_validators', feed_url))
 
-        summary_dict['description'], summary = self._get_description(
-            stoping_field=payment_type,
-            summary=summary
-        )
+    def _get_feed_watermark(self, feed_url: str) -> datetime | None:
+        watermark = caches[settings.XML_FEEDS_CACHE_NAME].get(self._feed_cache_key('feed_watermark', feed_url))
+        if watermark:
+            return datetime.fromisoformat(watermark)
+
+    def _save_feed_watermark(self, feed_url: str, watermark: datetime | None) -> None:
+        if watermark:
+            caches[settings.XML_FEEDS_CACHE_NAME].set(self._feed_cache_key('feed_watermark', feed_url),
+                                                      watermark.isoformat(),
+                                                      timeout=settings.XML_FEED_WATERMARK_TIMEOUT)
+
+    @staticmethod
+    def _get_entry_updated(entry: ElementTree.Element) -> datetime | None:
+        updated = entry.findtext("{http://www.w3.org/2005/Atom}updated")
+        if updated:
+            try:
+                updated = datetime.fromisoformat(updated)
+            except ValueError:
+                logger.warning(f"Not supported entry updated format {updated}")
+                return
+            return updated if updated.tzinfo else updated.replace(tzinfo=timezone.utc)
+
+    def _get_projects_from_xml(self, data: dict, watermark: datetime = None) -> tuple[list[dict], datetime | None]:
+        """ Parsing entries newer than watermark, feed entries are sorted from the newest to the oldest """
+        xml_projects = list()
+        shift = self._get_shift()
+        newest_updated = watermark
+
+        for entry in self.iter_xml_entries(xml=data['xml']):
+            updated = self._get_entry_updated(entry)
+            if watermark and updated and updated <= watermark:
+                break
 
-        summary_dict['project_type'] = "hourly"
-        if payment_type:
-            summary_dict[payment_type] = summary[:summary.find(settings.SUMMARY_TAGS['posted_on'])]
-            if payment_type == "budget":
-                summary_dict['project_type'] = "fixed"
+            if updated and (newest_updated is None or updated > newest_updated):
+                newest_updated = updated
 
-        summary_dict['category'] = self._get_category(summary=summary)
-        summary_dict['country'] = self._get_country(summary=summary)
-        return summary_dict
+            if self.cycle_id:
+                url = entry.findtext("{http://www.w3.org/2005/Atom}id")
+                if url and not claim_cycle_url(cycle_id=self.cycle_id, url=url, keyword=data['keyword']):
+                    continue
+
+            xml_projects.append(self._build_project(entry=entry, shift=shift, keyword=data['keyword']))
+        return xml_projects, newest_updated
 
     @staticmethod
-    def _get_description(summary: str, stoping_field: str) -> tuple:
-        if not stoping_field:
-            stoping_field = "posted_on"
-        description = summary[:summary.find(settings.SUMMARY_TAGS[stoping_field])]
-        summary = summary[summary.find(settings.SUMMARY_TAGS[stoping_field]):]
-        return description, summary
-
-    def _get_category(self, summary: str) -> str:
-        category = summary[summary.find("<b>Category</b>"):summary.find("<b>Skills</b>")]
-        return self.replace_field_from_string(
-            string_to_clean=category,
-            fields_to_replace=self.fields_to_replace)
-
-    def _get_country(self, summary: str) -> str:
-        country = summary[summary.find("<b>Country</b>"):summary.find("<a href")]
-        return self.replace_field_from_string(
-            string_to_clean=country,
-            fields_to_replace=self.fields_to_replace)
+    def iter_xml_entries(xml: str | bytes, chunk_size: int = 65536) -> Iterator[ElementTree.Element]:
+        """ Incremental parsing of the feed, every entry is released from the tree after it was handled """
+        if isinstance(xml, str):
+            xml = xml.encode()
+
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        root = None
+        xml_view = memoryview(xml)
+
+        for start in range(0, len(xml_view), chunk_size):
+            parser.feed(xml_view[start:start + chunk_size])
+
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    continue
+
+                if element.tag == '{http://www.w3.org/2005/Atom}entry':
+                    yield element
+                    root.remove(element)
+        parser.close()
+
+    def _build_project(self, entry: ElementTree.Element, shift: str, keyword: str) -> dict:
+        url = entry.find("{http://www.w3.org/2005/Atom}id").text
+        title = entry.find("{http://www.w3.org/2005/Atom}title").text
+        summary = entry.find("{http://www.w3.org/2005/Atom}summary").text
+        summary_record = self.parse_summary(summary=summary)
+
+        title, description, category, country = self.clean_many(
+            strings_to_clean=(title, summary_record.description, summary_record.category, summary_record.country),
+            symbols_to_clean=self.symbols_to_clean
+        )
+
+        return dict(
+            shift=shift,
+            url=url,
+            title=title,
+            description=description,
+            budget=self.get_number_from_string(
+                string_to_parse=summary_record.budget
+            ),
+            hourly=self._parse_hourly_range(
+                string_to_parse=summary_record.hourly_range
+            ),
+            category=category,
+            country=country,
+            project_type=summary_record.project_type,
+            skills=summary_record.skills,
+            posted_on=summary_record.posted_on.isoformat() if summary_record.posted_on else None,
+            keyword=keyword,
+        )
+
+    def parse_summary(self, summary: str) -> SummaryRecord:
+        return self.summary_tokenizer.tokenize(summary=summary)
 
     def _parse_hourly_range(self, string_to_parse: Optional[str]) -> Optional[float]:
         if string_to_parse:
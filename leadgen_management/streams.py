@@ -0,0 +1,173 @@
+import logging
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from services.codecs import get_codec, decode_payload
+
+
+logger = logging.getLogger('leadgen_management')
+
+
+class ProjectsStream:
+
+    """
+    Redis Stream hand-off of the scraped projects between the xml scrapers and the save stage.
+    Scrapers append one entry per project, the save worker reads them in micro-batches through the consumer group
+    and acknowledges only saved entries, so unsaved projects stay pending after a crash and are delivered again.
+    Entries which can not be decoded or are delivered too many times are moved to the dead letter stream.
+    """
+
+    def __init__(self, stream_name: str = None, group_name: str = None):
+        self.stream_name = stream_name or settings.PROJECTS_STREAM_NAME
+        self.group_name = group_name or settings.PROJECTS_STREAM_GROUP
+        self.dead_letter_name = '%s_dead' % self.stream_name
+        self.redis = get_redis_connection(settings.XML_FEEDS_CACHE_NAME)
+        self.codec = get_codec(settings.PAYLOAD_CODEC)
+
+    def add_many(self, projects: list[dict], cycle_id: str = None):
+        pipeline = self.redis.pipeline(transaction=False)
+        for project in projects:
+            pipeline.xadd(
+                self.stream_name,
+                {'project': self.codec.encode(project), 'cycle_id': cycle_id or ''},
+                maxlen=settings.PROJECTS_STREAM_MAXLEN,
+                approximate=True
+            )
+        pipeline.execute()
+
+    def create_group(self):
+        try:
+            self.redis.xgroup_create(self.stream_name, self.group_name, id='0', mkstream=True)
+        except ResponseError as ex:
+            if 'BUSYGROUP' not in str(ex):
+                raise
+
+    def claim_stale(self, consumer: str):
+        """ Taking over the pending entries of the consumers which died without acknowledging them """
+        start_id = '0-0'
+        while True:
+            response = self.redis.xautoclaim(
+                self.stream_name,
+                self.group_name,
+                consumer,
+                min_idle_time=settings.PROJECTS_STREAM_CLAIM_IDLE_MS,
+                start_id=start_id,
+                count=settings.PROJECTS_STREAM_BATCH_SIZE,
+                justid=True
+            )
+            start_id = response[0]
+            if start_id in (b'0-0', '0-0'):
+                return
+
+    def read_pending(self, consumer: str) -> list[tuple[str, dict]]:
+        """
+        Entries delivered to the consumer before but not acknowledged, poison entries are dropped.
+        A failed entry is delivered again only after it was idle PROJECTS_STREAM_RETRY_BACKOFF_MS doubled
+        for every previous delivery, redelivery resets the idle time, so failing entries are not retried in a loop.
+        """
+        retry_ids, dead_ids, start_id = [], [], '-'
+        while len(retry_ids) < settings.PROJECTS_STREAM_BATCH_SIZE:
+            pending = self.redis.xpending_range(
+                self.stream_name,
+                self.group_name,
+                min=start_id,
+                max='+',
+                count=settings.PROJECTS_STREAM_BATCH_SIZE,
+                consumername=consumer
+            )
+            for entry in pending:
+                if entry['times_delivered'] > settings.PROJECTS_STREAM_MAX_DELIVERIES:
+                    dead_ids.append(entry['message_id'])
+                elif entry['time_since_delivered'] >= self.retry_backoff(entry['times_delivered']):
+                    retry_ids.append(entry['message_id'])
+
+            if len(pending) < settings.PROJECTS_STREAM_BATCH_SIZE:
+                break
+            start_id = '(%s' % pending[-1]['message_id'].decode()
+
+        if dead_ids:
+            logger.error(f"Dead lettering projects stream entries delivered too many times {dead_ids}")
+            self.dead_letter(dead_ids)
+
+        if not retry_ids:
+            return []
+        retry_ids = retry_ids[:settings.PROJECTS_STREAM_BATCH_SIZE]
+        # claiming counts the delivery and resets the idle time as reading does
+        stream_entries = self.redis.xclaim(
+            self.stream_name,
+            self.group_name,
+            consumer,
+            min_idle_time=0,
+            message_ids=retry_ids
+        )
+        claimed_ids = {entry_id for entry_id, _ in stream_entries if entry_id is not None}
+        trimmed_ids = [entry_id for entry_id in retry_ids if entry_id not in claimed_ids]
+        if trimmed_ids:
+            # deleted by MAXLEN trimming, there is nothing to deliver again
+            self.ack(trimmed_ids)
+        return self._decode_entries([entry for entry in stream_entries if entry[0] is not None])
+
+    @staticmethod
+    def retry_backoff(times_delivered: int) -> int:
+        return settings.PROJECTS_STREAM_RETRY_BACKOFF_MS * 2 ** (times_delivered - 1)
+
+    def read_new(self, consumer: str) -> list[tuple[str, dict]]:
+        return self._read(consumer=consumer, stream_id='>', block=settings.PROJECTS_STREAM_BLOCK_MS)
+
+    def ack(self, entries_ids: list):
+        pipeline = self.redis.pipeline()
+        pipeline.xack(self.stream_name, self.group_name, *entries_ids)
+        pipeline.xdel(self.stream_name, *entries_ids)
+        pipeline.execute()
+
+    def dead_letter(self, entries_ids: list):
+        """ Moving the entries to the dead letter stream for inspection instead of dropping them """
+        pipeline = self.redis.pipeline(transaction=False)
+        for entry_id in entries_ids:
+            pipeline.xrange(self.stream_name, min=entry_id, max=entry_id)
+        entries = [entry for entry_range in pipeline.execute() for entry in entry_range]
+
+        pipeline = self.redis.pipeline()
+        for entry_id, fields in entries:
+            pipeline.xadd(
+                self.dead_letter_name,
+                {**fields, b'entry_id': entry_id},
+                maxlen=settings.PROJECTS_STREAM_MAXLEN,
+                approximate=True
+            )
+        pipeline.xack(self.stream_name, self.group_name, *entries_ids)
+        pipeline.xdel(self.stream_name, *entries_ids)
+        pipeline.execute()
+
+    def _read(self, consumer: str, stream_id: str, block: int = None) -> list[tuple[str, dict]]:
+        response = self.redis.xreadgroup(
+            self.group_name,
+            consumer,
+            {self.stream_name: stream_id},
+            count=settings.PROJECTS_STREAM_BATCH_SIZE,
+            block=block
+        )
+        return [entry for _, stream_entries in response or [] for entry in self._decode_entries(stream_entries)]
+
+    def _decode_entries(self, stream_entries: list) -> list[tuple[str, dict]]:
+        entries = []
+        for entry_id, fields in stream_entries:
+            # entries deleted by MAXLEN trimming are still pending but come back without fields
+            if not fields:
+                self.ack([entry_id])
+                continue
+
+            try:
+                entry = {
+                    'project': decode_payload(fields[b'project']),
+                    'cycle_id': fields[b'cycle_id'].decode() or None
+                }
+            except Exception as ex:
+                logger.error(f"Dead lettering projects stream entry {entry_id} which can not be decoded. {ex}")
+                self.dead_letter([entry_id])
+                continue
+
+            entries.append((entry_id, entry))
+        return entries
@@ -1,16 +1,18 @@
 import copy
-import json
 import time
+import uuid
+import socket
 import logging
 
 from django.utils import timezone
-from django.core.cache import cache, caches
+from django.core.cache import caches
 from django.conf import settings
 from httpx import HTTPStatusError
 # from pyairtable.formulas import match
 
 from server.celery import app
-from drivers import AirTableDriver, SlackDriver
+from drivers import AirTableDriver, SlackDriver, retry_delay
+from services.db import copy_insert
 from services.api.clients import UpworkJob
 from converters.fields_names_converter import NamesConverter
 from services.proposals import build_proposals_item, search_job_ciphertext
@@ -20,7 +22,10 @@ from upwork_auto_login.utils import get_rotated_auth_tokens, remove_auth_tokens_
 from leadgen_management.scrapers.xml_scraper import XmlScraper
 from leadgen_management.tasks_handler import TasksHandler
 from leadgen_management.models import Projects, Proposals
-from leadgen_management.utils import update_object_attrs, wait_tasks, add_user_id_to_cache, get_user_id_from_cache
+from leadgen_management.streams import ProjectsStream
+from leadgen_management.utils import (update_object_attrs, add_user_id_to_cache, get_user_id_from_cache,
+                                      get_cycle_matched_keywords, TasksPipeline, mapped_model_fields, BulkDispatcher,
+                                      iter_keyset_pages)
 
 tasks_handler = TasksHandler()
 logger = logging.getLogger('leadgen_management')
@@ -127,6 +132,7 @@ def update_private_proposals_responsible_on_at():
     records = at_driver.get_records(
         table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME,
         max_retries=settings.MAX_RETRIES,
+        snapshot=True
         # formula=match({"Responsible": ""})
     )
     if not records:
@@ -143,7 +149,7 @@ def update_private_proposals_responsible_on_at():
         logger.info('Not found private proposals for updating Responsible on Airtable!')
         return
 
-    update_data = []
+    update_data = {}
 
     for proposal in private_proposals:
         responsible_old = at_saved_urls[proposal.url][1]
@@ -152,21 +158,21 @@ def update_private_proposals_responsible_on_at():
 
         record_id = at_saved_urls[proposal.url][0]
         if not proposal.proposal_owner:
-            update_data.append({'id': record_id, 'fields': {"Responsible": None}})
+            update_data[record_id] = {"Responsible": None}
             continue
 
         user_id = get_user_id_from_cache(proposal.proposal_owner)
         if user_id:
-            update_data.append({'id': record_id, 'fields': {"Responsible": {"id": user_id}}})
+            update_data[record_id] = {"Responsible": {"id": user_id}}
 
     for _ in range(settings.MAX_RETRIES):
         try:
-            tasks_handler.update_batch(table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME, records=update_data)
+            tasks_handler.update_changed(table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME, records=update_data)
             logger.info('Updated Responsible')
             break
         except Exception as ex:
             logger.error(f"ERROR while updating private proposals into airtable. {ex}")
-            time.sleep(.3)
+            time.sleep(retry_delay(ex))
     else:
         body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
         body['message'] = ':exclamation: Update data error'
@@ -178,7 +184,13 @@ def update_private_proposals_responsible_on_at():
 @app.task
 def private_proposals_to_airtable():
     at_driver = AirTableDriver()
-    records = at_driver.get_records(table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME, max_retries=settings.MAX_RETRIES)
+    # every private proposal missing from the records is created, so a failed read must not look like an empty table
+    records = at_driver.get_records(
+        table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME,
+        max_retries=settings.MAX_RETRIES,
+        raise_exception=True,
+        snapshot=True
+    )
 
     at_saved_urls = [record["fields"]["URL"] for record in records if record.get('fields', {}).get('URL')]
     private_proposals = Proposals.objects.filter(job_private=True).exclude(url__in=at_saved_urls)
@@ -198,12 +210,12 @@ def private_proposals_to_airtable():
 
     for _ in range(settings.MAX_RETRIES):
         try:
-            tasks_handler.create_many(table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME, records=airtable_records)
+            tasks_handler.create_new(table_name=settings.PROPOSALS_PRIVATE_TABLE_NAME, records=airtable_records)
             logger.info('Updated ')
             break
         except Exception as ex:
             logger.error(f"ERROR while saving new private proposals into airtable. {ex}")
-            time.sleep(.3)
+            time.sleep(retry_delay(ex))
     else:
         body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
         body['message'] = ':exclamation: Saving data error'
@@ -216,45 +228,53 @@ def private_proposals_to_airtable():
 def update_private_proposals_from_at():
     table_name = settings.PROPOSALS_PRIVATE_TABLE_NAME
     at_driver = AirTableDriver()
-    records = at_driver.get_records(table_name=table_name, max_retries=settings.MAX_RETRIES)
-
-    if not records:
-        logger.info('Empty records from table %s' % settings.PROPOSALS_PRIVATE_TABLE_NAME)
-        return
-
     slack_driver = SlackDriver()
     notification_cache = caches[settings.PROPOSALS_NOTIFICATION_CACHE]
 
-    private_urls = Proposals.objects.filter(job_private=True).values_list('url', flat=True)
-    all_proposals_data = {proposals.url: proposals for proposals in Proposals.objects.all()}
-
     fields_map = copy.deepcopy(settings.AIRTABLE_PRIVATE_PROPOSALS_TABLE_FIELDS)
     if fields_map.get('URL') is not None:
         fields_map.pop('URL')  # removing match field, because we don't have to update this field
 
-    future_proposals, to_update_proposals = [], []
-    update_fields, handled_urls = set(), set()
+    # only the proposals Airtable returned, with the fields which can be changed, page by page
+    load_fields = {'id', 'url', 'job_private', 'job_removed_date'} | mapped_model_fields(fields_map)
+    handled_urls = set()
 
-    for record in records:
-        record_data = record.get('fields')
-        match record_data:
-            case {"Responsible": dict() as proposal_owner}:
-                name, user_id = proposal_owner.get('name'), proposal_owner.get('id')
-                if name and user_id:
-                    add_user_id_to_cache(name, user_id)
+    for records in at_driver.iter_pages(table_name=table_name, max_retries=settings.MAX_RETRIES, snapshot=True):
+        records_by_url = {}
+        for record in records:
+            record_data = record.get('fields')
+            match record_data:
+                case {"Responsible": dict() as proposal_owner}:
+                    name, user_id = proposal_owner.get('name'), proposal_owner.get('id')
+                    if name and user_id:
+                        add_user_id_to_cache(name, user_id)
+
+            match record_data:
+                case {"URL": str() as url, **other_fields} if url in handled_urls:
+                    # slack_driver.save_notification_to_cache(
+                    #     notification_cache=notification_cache,
+                    #     level='info',
+                    #     msg_header='Found duplicate URL\'s in %s' % table_name,
+                    #     message=f'Record ID: {record["id"]} <{url}|link>'
+                    # )
+                    logger.warning('Found duplicate in %s URL %s Record ID %s' % (table_name, url, record['id']))
+                case {"URL": str() as url, **other_fields}:
+                    records_by_url[url] = other_fields
+                    handled_urls.add(url)
+
+        if not records_by_url:
+            continue
 
-        match record_data:
-            case {"URL": str() as url, **other_fields} if url in handled_urls:
-                # slack_driver.save_notification_to_cache(
-                #     notification_cache=notification_cache,
-                #     level='info',
-                #     msg_header='Found duplicate URL\'s in %s' % table_name,
-                #     message=f'Record ID: {record["id"]} <{url}|link>'
-                # )
-                logger.warning('Found duplicate in %s URL %s Record ID %s' % (table_name, url, record['id']))
-                continue
+        saved_proposals = Proposals.objects.filter(
+            url__in=records_by_url.keys()
+        ).only(*load_fields).in_bulk(field_name='url')
+        future_proposals, to_update_proposals = [], []
+        update_fields = set()
 
-            case {"URL": str() as url, **other_fields} if url not in all_proposals_data.keys():
+        for url, other_fields in records_by_url.items():
+            proposals = saved_proposals.get(url)
+
+            if proposals is None:
                 new_proposals = Proposals(url=url, job_private=True, invalid_url=True)
                 update_object_attrs(obj=new_proposals, update_data=other_fields, fields=fields_map)
 
@@ -262,37 +282,37 @@ def update_private_proposals_from_at():
                     new_proposals.job_removed_date = timezone.now().date()
 
                 future_proposals.append(new_proposals)
-                handled_urls.add(url)
+                continue
 
-            case {"URL": str() as url, **other_fields}:
-                proposals = all_proposals_data[url]
-                updated = False
+            updated = False
 
-                if url not in private_urls:
-                    proposals.job_private = True
-                    update_fields.add('job_private')
-                    updated = True
+            if proposals.job_private is False:
+                proposals.job_private = True
+                update_fields.add('job_private')
+                updated = True
 
-                if other_fields.get(settings.PRIVATE_JOB_REMOVED_FIELD) is True and proposals.job_removed is False:
-                    proposals.job_removed_date = timezone.now().date()
-                    update_fields.add('job_removed_date')
-                    updated = True
+            if other_fields.get(settings.PRIVATE_JOB_REMOVED_FIELD) is True and proposals.job_removed is False:
+                proposals.job_removed_date = timezone.now().date()
+                update_fields.add('job_removed_date')
+                updated = True
 
-                updated_fields, _ = update_object_attrs(obj=proposals, update_data=other_fields, fields=fields_map)
-                if updated_fields:
-                    update_fields |= updated_fields
-                    updated = True
+            updated_fields, _ = update_object_attrs(obj=proposals, update_data=other_fields, fields=fields_map)
+            if updated_fields:
+                update_fields |= updated_fields
+                updated = True
 
-                if updated is True:
-                    to_update_proposals.append(proposals)
+            if updated is True:
+                to_update_proposals.append(proposals)
 
-                handled_urls.add(url)
+        if to_update_proposals and update_fields:
+            Proposals.objects.bulk_update(to_update_proposals, fields=update_fields)
 
-    if to_update_proposals and update_fields:
-        Proposals.objects.bulk_update(to_update_proposals, fields=update_fields)
+        if future_proposals:
+            copy_insert(Proposals, future_proposals)
 
-    if future_proposals:
-        Proposals.objects.bulk_create(future_proposals)
+    if not handled_urls:
+        logger.info('Empty records from table %s' % table_name)
+        return
 
     slack_driver.send_notification_from_cache(notification_cache)
     update_proposals_on_airtable()
@@ -301,7 +321,11 @@ def update_private_proposals_from_at():
 @app.task
 def update_proposals_on_airtable():
     at_driver = AirTableDriver()
-    records = at_driver.get_records(table_name=settings.PROPOSALS_TABLE_NAME, max_retries=settings.MAX_RETRIES)
+    records = at_driver.get_records(
+        table_name=settings.PROPOSALS_TABLE_NAME,
+        max_retries=settings.MAX_RETRIES,
+        snapshot=True
+    )
     if not records:
         logger.debug('Not found any records on Airtable %s' % settings.PROPOSALS_TABLE_NAME)
         return
@@ -312,24 +336,23 @@ def update_proposals_on_airtable():
         logger.debug('Not found any proposals records in DB')
         return
 
-    update_records = [
-        {
-            'id': proposal.air_id,
-            'fields': {air_field: getattr(proposal, db_field)
-                       for air_field, db_field in settings.AIRTABLE_PROPOSALS_TABLE_FIELDS.items()
-                       if db_field in settings.PROPOSALS_UPDATE_FIELDS
-                       and getattr(proposal, db_field) != records_data[proposal.air_id].get(air_field)}
-        }
+    update_records = {
+        proposal.air_id: {air_field: getattr(proposal, db_field)
+                          for air_field, db_field in settings.AIRTABLE_PROPOSALS_TABLE_FIELDS.items()
+                          if db_field in settings.PROPOSALS_UPDATE_FIELDS
+                          and getattr(proposal, db_field) != records_data[proposal.air_id].get(air_field)}
         for proposal in db_proposals if records_data.get(proposal.air_id)
-    ]
+    }
 
     for retry in range(settings.MAX_RETRIES):
         try:
-            at_driver.update_batch(settings.PROPOSALS_TABLE_NAME, records=update_records)
+            # the ledger drops the records without changes, batches written before a failure are not repeated
+            updated_count = at_driver.update_changed(settings.PROPOSALS_TABLE_NAME, records=update_records)
+            logger.info('Updated %s Proposals on AirTable' % updated_count)
             return
         except Exception as e:
             logger.error("Update Proposals on AirTable Error Retry %s: %s" % (retry + 1, e))
-            time.sleep(.3)
+            time.sleep(retry_delay(e))
     else:
         body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
         body['message'] = ':warning: Proposals warning'
@@ -342,19 +365,48 @@ def update_proposals_on_airtable():
 def update_proposals_from_airtable():
     at_driver = AirTableDriver()
     slack_driver = SlackDriver()
-    records = at_driver.get_records(table_name=settings.PROPOSALS_TABLE_NAME, max_retries=settings.MAX_RETRIES)
 
-    proposals_query = Proposals.objects.all()
-    saved_proposals_data = {
-        proposals.air_id: (proposals.url, proposals.scraped, proposals.invalid_url) for proposals in proposals_query
-    }
-    proposals_urls = proposals_query.values_list('url', flat=True)
-
-    delete_proposals_urls, future_proposals, proposals_update = [], [], []
-    scraping_tasks_ids = []
+    # one projected snapshot instead of full rows and per record queries
+    saved_proposals_data, saved_ids_by_air_id, proposals_urls = {}, {}, set()
+    for proposals_id, air_id, url, scraped, invalid_url in Proposals.objects.values_list(
+        'id', 'air_id', 'url', 'scraped', 'invalid_url'
+    ):
+        proposals_urls.add(url)
+        if air_id:
+            saved_proposals_data[air_id] = (url, scraped, invalid_url)
+            saved_ids_by_air_id.setdefault(air_id, []).append(proposals_id)
+
+    tasks_pipeline = TasksPipeline(callback=finish_proposals_scraping.si(sync_private_proposals=True))
     handled_urls = set()
     notification_cache = caches[settings.PROPOSALS_NOTIFICATION_CACHE]
 
+    # page N is written and dispatched while page N+1 is being fetched
+    try:
+        for records in at_driver.iter_pages(
+            table_name=settings.PROPOSALS_TABLE_NAME,
+            max_retries=settings.MAX_RETRIES,
+            snapshot=True
+        ):
+            handle_proposals_records_page(
+                records=records,
+                saved_proposals_data=saved_proposals_data,
+                saved_ids_by_air_id=saved_ids_by_air_id,
+                proposals_urls=proposals_urls,
+                handled_urls=handled_urls,
+                tasks_pipeline=tasks_pipeline,
+                slack_driver=slack_driver,
+                notification_cache=notification_cache
+            )
+    finally:
+        # the scrapes of the handled pages still finish the pipeline when reading fails midway
+        tasks_pipeline.close()
+
+
+def handle_proposals_records_page(records: list[dict], saved_proposals_data: dict, saved_ids_by_air_id: dict,
+                                  proposals_urls: set, handled_urls: set, tasks_pipeline: TasksPipeline,
+                                  slack_driver: SlackDriver, notification_cache):
+    delete_proposals_urls, future_proposals, detach_proposals_ids, duplicate_records = [], [], [], []
+
     for record in records:
         record_id = record['id']
         saved_proposals_info = saved_proposals_data.get(record_id)
@@ -378,10 +430,7 @@ def update_proposals_from_airtable():
                 'URL': str() as url,
                 **other_air_table_fields
             } if saved_proposals_info and saved_proposals_info[0] != url:
-                proposals = Proposals.objects.filter(air_id=record_id)
-                for proposal in proposals:
-                    proposal.air_id = None
-                    proposals_update.append(proposal)
+                detach_proposals_ids.extend(saved_ids_by_air_id[record_id])
 
                 proposals_instance = Proposals(air_id=record_id)
                 other_air_table_fields['URL'] = url
@@ -397,7 +446,7 @@ def update_proposals_from_airtable():
                 **other_air_table_fields
             } if saved_proposals_info and saved_proposals_info[0] == url and saved_proposals_info[1] is False:
                 if saved_proposals_info[2] is False:
-                    scraping_tasks_ids.append(scrape_job_proposals.delay(url).id)
+                    tasks_pipeline.add(scrape_job_proposals.si(url))
 
                 handled_urls.add(url)
             case {
@@ -411,18 +460,7 @@ def update_proposals_from_airtable():
                     message=url
                 )
                 handled_urls.add(url)
-
-                old_record = Proposals.objects.get(url=url)
-                old_record_fields = {
-                    air_field: getattr(old_record, list(db_field.values())[0])
-                    if isinstance(db_field, dict) else getattr(old_record, db_field)
-                    for air_field, db_field in settings.AIRTABLE_PROPOSALS_TABLE_FIELDS.items()
-                }
-                logger.error({
-                    'error_name': 'duplicate proposals',
-                    'new_record': record,
-                    'old_record': {'id': old_record.air_id, 'fields': old_record_fields}
-                })
+                duplicate_records.append(record)
                 # proposals = Proposals.objects.get(url=url)
                 # proposals.air_id = record_id
                 # proposals_update.append(proposals)
@@ -444,68 +482,96 @@ def update_proposals_from_airtable():
     if delete_proposals_urls:
         Proposals.objects.filter(url__in=delete_proposals_urls).delete()
 
-    if proposals_update:
-        Proposals.objects.bulk_update(proposals_update, fields={'air_id'})
-
-    if future_proposals:
-        Proposals.objects.bulk_create(future_proposals)
+    if detach_proposals_ids:
+        Proposals.objects.filter(id__in=detach_proposals_ids).update(air_id=None)
 
-        for proposals in future_proposals:
-            scraping_tasks_ids.append(
-                scrape_job_proposals.delay(proposals.url).id
-            )
-
-    if scraping_tasks_ids:
-        wait_tasks(scraping_tasks_ids)
+    if duplicate_records:
+        old_records = Proposals.objects.in_bulk(
+            [record['fields']['URL'] for record in duplicate_records], field_name='url'
+        )
+        for record in duplicate_records:
+            old_record = old_records.get(record['fields']['URL'])
+            if old_record is None:
+                continue
 
-    slack_driver.send_notification_from_cache(notification_cache)
-    notification_cache.clear()
+            old_record_fields = {
+                air_field: getattr(old_record, list(db_field.values())[0])
+                if isinstance(db_field, dict) else getattr(old_record, db_field)
+                for air_field, db_field in settings.AIRTABLE_PROPOSALS_TABLE_FIELDS.items()
+            }
+            logger.error({
+                'error_name': 'duplicate proposals',
+                'new_record': record,
+                'old_record': {'id': old_record.air_id, 'fields': old_record_fields}
+            })
 
-    private_proposals_to_airtable.delay()
-    update_proposals_on_airtable()
+    # only actually inserted proposals are scraped, URLs saved in the meantime are skipped by the ingest
+    for proposals in copy_insert(Proposals, future_proposals):
+        tasks_pipeline.add(scrape_job_proposals.si(proposals.url))
 
 
 @app.task
 def weekly_update_proposals():
-    week_ago = (timezone.now() - timezone.timedelta(days=7)).date()
+    # modified on a week ago date or earlier, the range keeps modified_at index usable unlike __date
+    modified_before = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timezone.timedelta(days=6)
     proposals_objs = Proposals.objects.filter(
-        modified_at__date__lte=week_ago,
+        modified_at__lt=modified_before,
         job_removed=False,
         job_private=False,
         invalid_url=False
     )
-    if not proposals_objs:
+    if not proposals_objs.exists():
         return
 
-    scraping_tasks_ids = []
-
-    for proposals in proposals_objs:
-        task = scrape_job_proposals.delay(proposals.url, update_fields=settings.PROPOSALS_UPDATE_FIELDS)
-        scraping_tasks_ids.append(task.id)
-
-    if scraping_tasks_ids:
-        wait_tasks(scraping_tasks_ids)
-
-        for proposals in proposals_objs:
-            proposals.modified_at = timezone.now()
+    tasks_pipeline = TasksPipeline(callback=finish_proposals_scraping.si())
+    try:
+        with BulkDispatcher(rate_limit=settings.PROPOSALS_DISPATCH_RATE_LIMIT) as dispatcher:
+            for page in iter_keyset_pages(proposals_objs, fields=('url',)):
+                published_before = dispatcher.published
+                try:
+                    tasks_pipeline.add_many(
+                        [scrape_job_proposals.si(url, update_fields=settings.PROPOSALS_UPDATE_FIELDS)
+                         for _, url in page],
+                        dispatcher=dispatcher
+                    )
+                finally:
+                    # only the published ones are refreshed, the rest are picked up by the next run
+                    published = page[:dispatcher.published - published_before]
+                    if published:
+                        Proposals.objects.filter(pk__in=[pk for pk, _ in published]).update(modified_at=timezone.now())
+    finally:
+        # the scrapes of the dispatched pages still finish the pipeline when dispatching fails midway
+        tasks_pipeline.close()
 
-        Proposals.objects.bulk_update(proposals_objs, fields={'modified_at'})
 
+@app.task
+def finish_proposals_scraping(sync_private_proposals: bool = False):
+    """ Last stage of the proposals scraping pipelines, sent once all scrape_job_proposals subtasks are done """
     slack_driver = SlackDriver()
     notification_cache = caches[settings.PROPOSALS_NOTIFICATION_CACHE]
     slack_driver.send_notification_from_cache(notification_cache)
     notification_cache.clear()
 
+    if sync_private_proposals:
+        private_proposals_to_airtable.delay()
     update_proposals_on_airtable()
 
 
+@app.task
+def tasks_pipeline_step_done(pipeline_key: str):
+    TasksPipeline.step_done(pipeline_key)
+
+
 @app.task
 def scrap_xml_task(data: dict):
     try:
-        xml_scraper = XmlScraper()
+        xml_scraper = XmlScraper(cycle_id=data.get('cycle_id'))
         projects_list = xml_scraper.scrap_and_parse_projects(feed_url=data['feed_url'], keyword=data['keyword'])
         if projects_list:
-            cache.set(data['keyword'], json.dumps(projects_list))
+            ProjectsStream().add_many(projects=projects_list, cycle_id=data.get('cycle_id'))
+            save_projects_task.delay()
+        xml_scraper.commit_feed_state(feed_url=data['feed_url'])
+        if projects_list:
             return {"status": "OK"}
     except Exception as ex:
         logger.error(f"ERROR while scraping xml. {ex}")
@@ -513,9 +579,19 @@ def scrap_xml_task(data: dict):
 
 @app.task()
 def get_feed_urls_from_airtable_task():
-    data_from_filters_table = tasks_handler.get_data_from_filters_table(scrap_task=scrap_xml_task)
-    wait_tasks(data_from_filters_table['task_ids_storage'])
-    save_projects_task.apply_async(kwargs={"keywords_list": data_from_filters_table['keywords_list']})
+    feeds = tasks_handler.get_feeds_from_filters_table()
+    projects_stream = ProjectsStream()
+    cycle_id = uuid.uuid4().hex
+
+    try:
+        xml_scraper = XmlScraper(cycle_id=cycle_id)
+        for keyword, projects_list in xml_scraper.iter_scrap_and_parse_many(feeds=feeds):
+            if projects_list:
+                # saving overlaps scraping of the next feeds, matched keywords are read from the cycle when saving
+                projects_stream.add_many(projects=projects_list, cycle_id=cycle_id)
+                save_projects_task.delay()
+    except Exception as ex:
+        logger.error(f"ERROR while scraping xml feeds. {ex}")
 
     slack_driver = SlackDriver()
     notification_cache = caches[settings.PROJECTS_NOTIFICATION_CACHE]
@@ -524,35 +600,115 @@ def get_feed_urls_from_airtable_task():
 
 
 @app.task
-def save_projects_task(keywords_list: list):
-    try:
-        for keyword in keywords_list:
-            projects_list = cache.get(keyword)
-            saved_projects = tasks_handler.save_projects_to_database(projects_list=json.loads(projects_list))
-            names_converter = NamesConverter()
-            airtable_projects = names_converter.many_from_db_to_airtable(records=saved_projects, table_name="Projects")
+def save_projects_task():
+    """ Consuming the projects stream in micro-batches until it is drained, pending entries go first """
+    projects_stream = ProjectsStream()
+    consumer = socket.gethostname()
 
-            for _ in range(settings.MAX_RETRIES):
-                try:
-                    tasks_handler.create_many(table_name=settings.PROJECTS_TABLE_NAME, records=airtable_projects)
+    try:
+        projects_stream.create_group()
+        projects_stream.claim_stale(consumer=consumer)
+
+        read_pending, pending_ids = True, None
+        while True:
+            if read_pending:
+                entries = projects_stream.read_pending(consumer=consumer)
+                entries_ids = [entry_id for entry_id, _ in entries]
+                if entries_ids and entries_ids == pending_ids:
+                    # failed again right away, the next run retries them after the backoff
                     break
-                except Exception as ex:
-                    logger.error(f"ERROR while saving new projects into airtable. {ex}")
-                    time.sleep(.3)
+                pending_ids = entries_ids
+                read_pending = bool(entries)
             else:
-                body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
-                body['message'] = ':exclamation: Saving data error'
-                body['details'] = ['Error while saving new projects into airtable.']
-                body['error_time_utc'] = timezone.now().utcnow().strftime('%d.%m.%Y %H:%M')
-                SlackDriver().error_notification(body)
+                entries = projects_stream.read_new(consumer=consumer)
+                if not entries:
+                    break
+
+            if entries:
+                save_projects_entries(projects_stream=projects_stream, entries=entries, redelivered=read_pending)
     except Exception as ex:
         logger.error(f"ERROR while saving new projects. {ex}")
 
 
+def save_projects_entries(projects_stream: ProjectsStream, entries: list[tuple[str, dict]], redelivered: bool):
+    """
+    Saving the entries in one batch, when the batch fails the entries are saved one by one,
+    so only the failing ones stay pending and reach the dead letter stream after PROJECTS_STREAM_MAX_DELIVERIES
+    """
+    try:
+        save_projects_batch(projects=[entry for _, entry in entries], redelivered=redelivered)
+        projects_stream.ack([entry_id for entry_id, _ in entries])
+        return
+    except Exception as ex:
+        logger.error(f"ERROR while saving projects batch, saving entries one by one. {ex}")
+
+    saved_ids = []
+    for entry_id, entry in entries:
+        try:
+            # a part of the failed batch could be saved already
+            save_projects_batch(projects=[entry], redelivered=True)
+        except Exception as ex:
+            logger.error(f"ERROR while saving projects stream entry {entry_id}. {ex}")
+            continue
+        saved_ids.append(entry_id)
+
+    if saved_ids:
+        projects_stream.ack(saved_ids)
+
+
+def save_projects_batch(projects: list[dict], redelivered: bool = False):
+    projects_list = []
+
+    for cycle_id in {project['cycle_id'] for project in projects}:
+        cycle_projects = [project['project'] for project in projects if project['cycle_id'] == cycle_id]
+
+        if cycle_id:
+            matched_keywords = get_cycle_matched_keywords(
+                cycle_id=cycle_id,
+                urls=[project['url'] for project in cycle_projects if project.get('url')]
+            )
+            for project in cycle_projects:
+                project['matched_keywords'] = matched_keywords.get(project.get('url'))
+        projects_list.extend(cycle_projects)
+
+    saved_projects = tasks_handler.save_projects_to_database(projects_list=projects_list, redelivered=redelivered)
+    names_converter = NamesConverter()
+    airtable_projects = names_converter.many_from_db_to_airtable(records=saved_projects, table_name="Projects")
+
+    for _ in range(settings.MAX_RETRIES):
+        try:
+            # projects created before a failure are not created again on retry
+            tasks_handler.create_new(table_name=settings.PROJECTS_TABLE_NAME, records=airtable_projects)
+            break
+        except Exception as ex:
+            logger.error(f"ERROR while saving new projects into airtable. {ex}")
+            time.sleep(retry_delay(ex))
+    else:
+        body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
+        body['message'] = ':exclamation: Saving data error'
+        body['details'] = ['Error while saving new projects into airtable.']
+        body['error_time_utc'] = timezone.now().utcnow().strftime('%d.%m.%Y %H:%M')
+        SlackDriver().error_notification(body)
+
+    # air_id marks the pushed projects, redelivered entries push again only the saved projects without it
+    air_ids = tasks_handler.created_record_ids(
+        table_name=settings.PROJECTS_TABLE_NAME,
+        keys=[project.url for project in saved_projects]
+    )
+    pushed_projects = []
+    for project in saved_projects:
+        if project.url in air_ids:
+            project.air_id = air_ids[project.url]
+            pushed_projects.append(project)
+
+    if pushed_projects:
+        Projects.objects.bulk_update(pushed_projects, fields=['air_id'])
+
+
 @app.task
-def synchronization_task(table_name: str):
+def synchronization_task(table_name: str, full: bool = None):
     try:
-        tasks_handler.update_all_records(table_name=table_name)
+        tasks_handler.update_all_records(table_name=table_name, full=full)
     except Exception as ex:
         logger.error(f"ERROR while syncing {table_name} table. {ex}")
         body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
@@ -565,9 +721,33 @@ def synchronization_task(table_name: str):
 @app.task
 def update_proposals_industry_info():
     proposals = Proposals.objects.filter(job_private=False, invalid_url=False)
-    for proposals in proposals:
-        scrape_job_proposals.delay(
-            job_url=proposals.url,
-            update_fields=['industry_size', 'company_size', 'company_category']
-        )
+    with BulkDispatcher(rate_limit=settings.PROPOSALS_DISPATCH_RATE_LIMIT) as dispatcher:
+        for page in iter_keyset_pages(proposals, fields=('url',)):
+            dispatcher.publish([
+                scrape_job_proposals.si(job_url=url, update_fields=['industry_size', 'company_size', 'company_category'])
+                for _, url in page
+            ])
+
+
+@app.task
+def fill_projects_fingerprints():
+    """
+    Filling duplicates fingerprints of the current month projects saved before fingerprints were added,
+    scheduled once as a one-off beat task after migrate
+    """
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    projects = Projects.objects.filter(created_at__gte=month_start, fingerprint__isnull=True).only(
+        'id', 'title', 'country', 'project_type', 'created_at'
+    )
+    projects_to_update = []
+
+    for project in projects.iterator(chunk_size=settings.DB_LOOKUP_CHUNK_SIZE):
+        project.fill_fingerprint()
+        projects_to_update.append(project)
+
+        if len(projects_to_update) >= settings.DB_LOOKUP_CHUNK_SIZE:
+            Projects.objects.bulk_update(projects_to_update, fields=('fingerprint', 'month_bucket'))
+            projects_to_update = []
 
+    if projects_to_update:
+        Projects.objects.bulk_update(projects_to_update, fields=('fingerprint', 'month_bucket'))
@@ -2,14 +2,19 @@ import copy
 import logging
 
 from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from pyairtable.formulas import match
 
 from drivers import AirTableDriver, SlackDriver
 from converters.fields_names_converter import NamesConverter
+from services.db import copy_insert, copy_upsert
 from services.utils import import_model
+from services.write_ledger import AirTableWriteLedger
 
 from leadgen_management.models import Projects
+from leadgen_management.utils import get_existing_values
 
 
 logger = logging.getLogger('leadgen_management')
@@ -20,9 +25,8 @@ class TasksHandler(AirTableDriver, NamesConverter):
     def __init__(self):
         super(TasksHandler, self).__init__()
 
-    def get_data_from_filters_table(self, scrap_task) -> dict:
-        keywords_list = []
-        task_ids_storage = []
+    def get_feeds_from_filters_table(self) -> list[dict]:
+        feeds = []
         try:
             active_filters = self.get_records(
                 settings.FILTERS_TABLE_NAME,
@@ -31,13 +35,10 @@ class TasksHandler(AirTableDriver, NamesConverter):
                 view=settings.AIRTABLE_FILTERS_TABLE_VIEW
             )
             for data in active_filters:
-                data_to_scrap = {
+                feeds.append({
                     "keyword": data['fields']['Keyword'],
                     "feed_url": data['fields']['Feed URL']
-                }
-                keywords_list.append(data_to_scrap['keyword'])
-                result = scrap_task.apply_async(kwargs={'data': data_to_scrap})
-                task_ids_storage.append(str(result))
+                })
         except Exception as ex:
             logger.error(f"ERROR while trying to get data from Airtable Filters table. {ex}")
             body = copy.deepcopy(settings.ERROR_MSG_SNIPPED)
@@ -46,21 +47,34 @@ class TasksHandler(AirTableDriver, NamesConverter):
             body['error_time_utc'] = timezone.now().utcnow().strftime('%d.%m.%Y %H:%M')
             SlackDriver().error_notification(body)
 
-        return {"keywords_list": keywords_list, "task_ids_storage": task_ids_storage}
+        return feeds
 
     @staticmethod
-    def save_projects_to_database(projects_list: list) -> list:
+    def save_projects_to_database(projects_list: list, redelivered: bool = False) -> list:
+        """
+        Saved new projects which are to be pushed to Airtable. For the redelivered projects the already saved ones
+        which were not pushed yet (no air_id) are returned too, the crash could happen between saving and pushing.
+        """
         try:
-            today = timezone.now()
-            saved_urls = Projects.objects.values_list('url', flat=True)
+            month_bucket = Projects.build_month_bucket(timezone.now())
+            saved_urls = get_existing_values(
+                queryset=Projects.objects.all(),
+                field='url',
+                values=(project['url'] for project in projects_list if project.get('url'))
+            )
 
-            last_month_projects = Projects.objects.filter(created_at__date__month=today.month,
-                                                          created_at__date__year=today.year)
             check_fields = ('title', 'country', 'project_type')
-            checklist = set(last_month_projects.values_list(*check_fields))
+            fingerprints = [
+                Projects.build_fingerprint(*(project.get(key) for key in check_fields)) for project in projects_list
+            ]
+            checklist = get_existing_values(
+                queryset=Projects.objects.filter(month_bucket=month_bucket),
+                field='fingerprint',
+                values=fingerprints
+            )
             new_projects, handled_urls, duplicates_to_saving = [], set(), []
 
-            for project in projects_list:
+            for project, fingerprint in zip(projects_list, fingerprints):
                 try:
                     url, keyword = project['url'], project['keyword']
                 except KeyError as key_err:
@@ -84,62 +98,142 @@ class TasksHandler(AirTableDriver, NamesConverter):
                         country=project.get('country'),
                         category=project.get('category'),
                         description=project.get('description'),
-                        project_type=project.get('project_type')
+                        project_type=project.get('project_type'),
+                        matched_keywords=', '.join(project.get('matched_keywords') or []) or None,
+                        fingerprint=fingerprint,
+                        month_bucket=month_bucket
                     )
-                    checking_values = tuple(project.get(key) for key in check_fields)
 
-                    if checking_values in checklist:
+                    if new_project.fingerprint in checklist:
                         new_project.duplicate = True
                         duplicates_to_saving.append(new_project)
                         continue
 
                     new_projects.append(new_project)
                     handled_urls.add(url)
-                    checklist.add(checking_values)
+                    checklist.add(new_project.fingerprint)
 
             if duplicates_to_saving:
-                Projects.objects.bulk_create(duplicates_to_saving)
-
-            return Projects.objects.bulk_create(new_projects)
+                copy_insert(Projects, duplicates_to_saving)
+
+            # projects saved by a concurrent consumer in the meantime are skipped, not pushed to Airtable twice
+            saved_projects = copy_insert(Projects, new_projects)
+
+            if redelivered and saved_urls:
+                # the monthly duplicates are saved without air_id too, but they are never pushed
+                earlier_duplicates = Projects.objects.filter(
+                    month_bucket=OuterRef('month_bucket'),
+                    fingerprint=OuterRef('fingerprint'),
+                    id__lt=OuterRef('id')
+                )
+                saved_projects.extend(
+                    Projects.objects.filter(url__in=saved_urls, air_id__isnull=True).exclude(Exists(earlier_duplicates))
+                )
+            return saved_projects
         except Exception as ex:
             logger.error(f"ERROR while saving projects to database. {ex}")
-
-    def update_all_records(self, table_name: str):
+            raise
+
+    def update_all_records(self, table_name: str, full: bool = None):
+        """
+        Incremental sync fetches only the records modified after the table watermark,
+        full reconcile fetches the whole table and deletes the rows removed from Airtable for the tables
+        with `delete_removed` in TASKS_HANDLER_MAP.
+        Full reconcile runs when `full` is True, when there is no watermark yet or once in AIRTABLE_FULL_SYNC_INTERVAL.
+        """
         model_path = settings.TASKS_HANDLER_MAP[table_name]['model']
         model_fields = settings.TASKS_HANDLER_MAP[table_name]['fields']
         match_field = settings.TASKS_HANDLER_MAP[table_name]['match_field']
         model = import_model(model_path)
 
-        records = self.get_records(table_name=table_name, max_retries=settings.MAX_RETRIES)
-        converted_records = self.convert_records_to_database_format(
-            table_name=table_name,
-            records=records,
-            db_fields=model_fields
-        )
-        records_to_update = []
-        matches_values = set()
+        sync_cache = caches[settings.AIRTABLE_SYNC_CACHE_NAME]
+        watermark = sync_cache.get('sync_watermark_%s' % table_name)
+        if full is None:
+            full = watermark is None or sync_cache.get('sync_full_%s' % table_name) is None
+
+        sync_started_at = timezone.now()
+        fetch_kwargs = {}
+        if not full:
+            # overlap covers the records which were being saved in Airtable while the previous sync was reading
+            modified_after = watermark - timezone.timedelta(seconds=settings.AIRTABLE_SYNC_WATERMARK_OVERLAP)
+            fetch_kwargs['formula'] = "IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('%s'))" % (
+                modified_after.strftime('%Y-%m-%dT%H:%M:%SZ')
+            )
 
-        for record in converted_records:
-            match_field_value = record.get(match_field)
+        fields_to_update = copy.copy(model_fields)
+        fields_to_update.remove(match_field)
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        matches_values, airtable_ids = set(), set()
+
+        # page N is written while page N+1 is being fetched, only match values and ids are kept between pages
+        write_ledger = AirTableWriteLedger(table_name)
+        for records in self.iter_pages(table_name=table_name, max_retries=settings.MAX_RETRIES, **fetch_kwargs):
+            airtable_ids.update(record['id'] for record in records)
+            if not full:
+                # modified in Airtable since the last sync, maybe by hand
+                write_ledger.forget(record['id'] for record in records)
+            converted_records = self.convert_records_to_database_format(
+                table_name=table_name,
+                records=records,
+                db_fields=model_fields
+            )
+            records_to_update = []
 
-            if record.get(match_field) is None or match_field_value in matches_values:
-                logger.warning('Found duplicate in %s: %s' % (table_name, record))
-                continue
+            for record in converted_records:
+                match_field_value = record.get(match_field)
+
+                if record.get(match_field) is None or match_field_value in matches_values:
+                    logger.warning('Found duplicate in %s: %s' % (table_name, record))
+                    continue
 
-            matches_values.add(match_field_value)
-            records_to_update.append(model(**record))
+                matches_values.add(match_field_value)
+                obj = model(**record)
+                if model is Projects:
+                    # only inserted rows take it, fingerprint is not among the updated fields
+                    obj.fill_fingerprint()
+                records_to_update.append(obj)
 
-        if not records_to_update:
+            if not records_to_update:
+                continue
+
+            try:
+                page_counts = copy_upsert(
+                    model,
+                    records_to_update,
+                    match_field=match_field,
+                    update_fields=fields_to_update
+                )
+            except Exception as ex:
+                logger.error(f"Exception while trying to bulk update. {ex}")
+                return
+
+            for key, count in page_counts.items():
+                counts[key] += count
+
+        if not matches_values:
             logger.debug('Not found records to update for %s' % table_name)
-            return
+        else:
+            logger.info('Synchronized %s: %s' % (table_name, counts))
 
-        fields_to_update = copy.copy(model_fields)
-        fields_to_update.remove(match_field)
-        try:
-            model.objects.bulk_update_or_create(
-                records_to_update,
-                fields_to_update,
-                match_field=match_field
-            )
-        except Exception as ex:
-            logger.error(f"Exception while trying to bulk update. {ex}")
+        if full:
+            # only the tables which opt in, Projects and Proposals rows are needed after removal from Airtable,
+            # an empty fetch deletes nothing, it is more likely a broken view than an emptied table
+            if airtable_ids and settings.TASKS_HANDLER_MAP[table_name].get('delete_removed'):
+                self._delete_removed_records(model=model, table_name=table_name, airtable_ids=airtable_ids)
+            sync_cache.set('sync_full_%s' % table_name, sync_started_at, timeout=settings.AIRTABLE_FULL_SYNC_INTERVAL)
+
+        sync_cache.set('sync_watermark_%s' % table_name, sync_started_at, timeout=None)
+
+    @staticmethod
+    def _delete_removed_records(model, table_name: str, airtable_ids: set[str]):
+        """ Deleting rows synced from Airtable before, whose records are not in the table any more """
+        removed_ids = [
+            pk for pk, air_id in model.objects.filter(air_id__isnull=False).values_list('id', 'air_id')
+            if air_id not in airtable_ids
+        ]
+        chunk_size = settings.DB_LOOKUP_CHUNK_SIZE
+        for i in range(0, len(removed_ids), chunk_size):
+            model.objects.filter(id__in=removed_ids[i: i + chunk_size]).delete()
+
+        if removed_ids:
+            logger.info('Deleted %s rows removed from Airtable table %s' % (len(removed_ids), table_name))
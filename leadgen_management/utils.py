@@ -1,10 +1,15 @@
+import json
 import time
-from typing import Any
+import uuid
+import hashlib
+from typing import Any, Iterator
 
-from celery.result import AsyncResult
+from celery import Signature
 from django.conf import settings
 from django.core.cache import caches
+from django_redis import get_redis_connection
 
+from server.celery import app
 from leadgen_management.models import BaseModel
 
 
@@ -23,21 +28,177 @@ def get_user_id_from_cache(name: str) -> str | None:
     return users_cache.get('proposals_owner_%s' % name)
 
 
-def wait_tasks(tasks_ids: list[str]):
-    tasks = [AsyncResult(task_id) for task_id in tasks_ids or []]
+def _cycle_url_key(cycle_id: str, url: str) -> str:
+    return 'cycle_%s_url_%s' % (cycle_id, hashlib.md5(url.encode()).hexdigest())
 
-    while tasks:
-        for task in tasks:
-            if task.ready():
-                tasks.remove(task)
 
-        time.sleep(1)
+def claim_cycle_url(cycle_id: str, url: str, keyword: str) -> bool:
+    """ Only the first keyword of the scrape cycle parses the project, others are recorded as matched keywords """
+    redis = get_redis_connection(settings.XML_FEEDS_CACHE_NAME)
+    key = _cycle_url_key(cycle_id, url)
+
+    if redis.set(key, keyword, nx=True, ex=settings.SCRAPE_CYCLE_TIMEOUT):
+        return True
+
+    pipeline = redis.pipeline()
+    pipeline.sadd(key + '_keywords', keyword)
+    pipeline.expire(key + '_keywords', settings.SCRAPE_CYCLE_TIMEOUT)
+    pipeline.execute()
+    return False
+
+
+def get_cycle_matched_keywords(cycle_id: str, urls: list[str]) -> dict[str, list[str]]:
+    redis = get_redis_connection(settings.XML_FEEDS_CACHE_NAME)
+    pipeline = redis.pipeline()
+
+    for url in urls:
+        pipeline.smembers(_cycle_url_key(cycle_id, url) + '_keywords')
+
+    return {
+        url: sorted(keyword.decode() for keyword in keywords)
+        for url, keywords in zip(urls, pipeline.execute()) if keywords
+    }
+
+
+class TasksPipeline:
+
+    """
+    Completion counter of the dispatched subtasks instead of waiting for them inside a worker.
+    Every subtask decrements the counter on success or failure, the callback is sent by the last one.
+    """
+
+    step_task_name = 'leadgen_management.tasks.tasks_pipeline_step_done'
+
+    def __init__(self, callback: Signature, pipeline_id: str = None):
+        self.key = 'tasks_pipeline_%s' % (pipeline_id or uuid.uuid4().hex)
+        redis = get_redis_connection('default')
+        pipeline = redis.pipeline()
+        # the dispatcher holds one step until all subtasks are sent, so the callback can't be fired too early
+        pipeline.set(self.key, 1, ex=settings.TASKS_PIPELINE_TIMEOUT)
+        pipeline.set(self.key + '_callback', json.dumps(callback), ex=settings.TASKS_PIPELINE_TIMEOUT)
+        pipeline.execute()
+
+    def add(self, signature: Signature):
+        redis = get_redis_connection('default')
+        redis.incr(self.key)
+        try:
+            signature.apply_async(link=self.step, link_error=self.step)
+        except Exception:
+            redis.decr(self.key)
+            raise
+
+    def add_many(self, signatures: list[Signature], dispatcher: 'BulkDispatcher'):
+        """
+        Counting the whole batch by one request and publishing it through the dispatcher,
+        the signatures left unpublished by a failure are uncounted, so the callback is not lost
+        """
+        redis = get_redis_connection('default')
+        redis.incrby(self.key, len(signatures))
+        published_before = dispatcher.published
+        try:
+            dispatcher.publish(signatures, link=self.step, link_error=self.step)
+        finally:
+            unpublished = len(signatures) - (dispatcher.published - published_before)
+            if unpublished:
+                redis.decrby(self.key, unpublished)
+
+    @property
+    def step(self) -> Signature:
+        return app.signature(self.step_task_name, args=(self.key,), immutable=True)
+
+    def close(self):
+        """ Releasing the dispatcher step, the callback is sent right away when there were no subtasks """
+        self.step_done(self.key)
+
+    @staticmethod
+    def step_done(key: str):
+        redis = get_redis_connection('default')
+        if redis.decr(key) != 0:
+            return
+
+        callback = redis.get(key + '_callback')
+        redis.delete(key, key + '_callback')
+        if callback:
+            app.signature(json.loads(callback)).apply_async()
+
+
+class BulkDispatcher:
+
+    """
+    Publishing many task messages through one producer connection instead of acquiring it per delay() call.
+    rate_limit caps the published tasks per second, no cap when it is empty.
+    """
+
+    def __init__(self, rate_limit: float = None):
+        self.rate_limit = rate_limit
+        self.published = 0
+        self._producer_context = None
+        self.producer = None
+        self.started_at = None
+
+    def __enter__(self):
+        self._producer_context = app.producer_or_acquire()
+        self.producer = self._producer_context.__enter__()
+        self.started_at = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._producer_context.__exit__(*exc_info)
+
+    def publish(self, signatures: list[Signature], **options):
+        for signature in signatures:
+            signature.apply_async(producer=self.producer, **options)
+            self.published += 1
+
+        if self.rate_limit:
+            ahead = self.published / self.rate_limit - (time.monotonic() - self.started_at)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def iter_keyset_pages(queryset, fields: tuple, page_size: int = None) -> Iterator[list[tuple]]:
+    """ Walking the queryset in primary key order page by page, pk is the first value of every row """
+    page_size = page_size or settings.DB_LOOKUP_CHUNK_SIZE
+    last_pk = None
+
+    while True:
+        page_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page_queryset.order_by('pk').values_list('pk', *fields)[:page_size])
+        if not rows:
+            return
+
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def get_existing_values(queryset, field: str, values, chunk_size: int = None) -> set:
+    """ Asking DB only about the candidate values in chunks instead of loading the whole column """
+    chunk_size = chunk_size or settings.DB_LOOKUP_CHUNK_SIZE
+    values = list(set(values))
+    existing_values = set()
+
+    for i in range(0, len(values), chunk_size):
+        existing_values.update(
+            queryset.filter(**{'%s__in' % field: values[i: i + chunk_size]}).values_list(field, flat=True)
+        )
+    return existing_values
 
 
 def model_verbose_fields(model, fields):
     return [model._meta.get_field(field).verbose_name.upper() for field in fields]
 
 
+def mapped_model_fields(fields: dict[str, str | dict[str, str]]) -> set[str]:
+    """ Model fields names of the Airtable fields map, including nested ones """
+    model_fields = set()
+    for model_field_name in fields.values():
+        if isinstance(model_field_name, dict):
+            model_fields |= mapped_model_fields(model_field_name)
+        else:
+            model_fields.add(model_field_name)
+    return model_fields
+
+
 def update_object_attrs(obj, update_data: dict[str, Any],
                         fields: dict[str, str | dict[str, str]] = None) -> tuple[set[str], bool]:
     updated = False
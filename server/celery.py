@@ -32,10 +32,6 @@ BASE_SYNCHRONIZATION_QUEUE_ROUTE = {'queue': 'synchronization', 'routing_key': '
 BASE_GENERIC_QUEUE_ROUTE = {'queue': 'generic', 'routing_key': 'generic'}
 BASE_UPWORK_QUEUE_ROUTE = {'queue': 'upwork_auto_login', 'routing_key': 'upwork_auto_login'}
 
-# TODO: create a new queue or separate the scrape_job_proposals task from the update_proposals_from_airtable task,
-#  because the task update_proposals_from_airtable is waiting for the completion of all tasks running in it for
-#  scraping and this can lead to the employment of all the concurrency of the queue
-
 # bind routing with queues
 app.conf.task_routes = {
     'upwork_auto_login.tasks.*': BASE_UPWORK_QUEUE_ROUTE,
@@ -44,6 +40,8 @@ app.conf.task_routes = {
     'leadgen_management.tasks.update_proposals_from_airtable': BASE_GENERIC_QUEUE_ROUTE,
     'leadgen_management.tasks.update_proposals_on_airtable': BASE_GENERIC_QUEUE_ROUTE,
     'leadgen_management.tasks.weekly_update_proposals': BASE_GENERIC_QUEUE_ROUTE,
+    'leadgen_management.tasks.finish_proposals_scraping': BASE_GENERIC_QUEUE_ROUTE,
+    'leadgen_management.tasks.tasks_pipeline_step_done': BASE_GENERIC_QUEUE_ROUTE,
     'leadgen_management.tasks.private_proposals_to_airtable': BASE_GENERIC_QUEUE_ROUTE,
     'leadgen_management.tasks.update_private_proposals_from_at': BASE_GENERIC_QUEUE_ROUTE,
     'leadgen_management.tasks.update_private_proposals_responsible_on_at': BASE_GENERIC_QUEUE_ROUTE,
@@ -52,4 +50,5 @@ app.conf.task_routes = {
     'leadgen_management.tasks.save_projects_task': BASE_SAVE_PROJECTS_QUEUE_ROUTE,
     'leadgen_management.tasks.synchronization_task': BASE_SYNCHRONIZATION_QUEUE_ROUTE,
     'leadgen_management.tasks.update_proposals_industry_info': BASE_GENERIC_QUEUE_ROUTE,
+    'leadgen_management.tasks.fill_projects_fingerprints': BASE_GENERIC_QUEUE_ROUTE,
 }
@@ -76,7 +76,16 @@ WSGI_APPLICATION = 'server.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-POSTGRES_DB_CONNECTION_URL = dj_database_url.config(default=config('POSTGRES_DB_CONNECTION_URL'))
+# persistent connection per process (gunicorn worker / celery prefork child), reused until it gets older than
+# DB_CONN_MAX_AGE seconds or fails the health check, celery closes the connections inherited by forked children
+POSTGRES_DB_CONNECTION_URL = dj_database_url.config(
+    default=config('POSTGRES_DB_CONNECTION_URL'),
+    conn_max_age=int(config('DB_CONN_MAX_AGE', 600)),
+    conn_health_checks=config('DB_CONN_HEALTH_CHECKS', True, cast=bool)
+)
+POSTGRES_DB_CONNECTION_URL.setdefault('OPTIONS', {})['connect_timeout'] = int(config('DB_CONNECT_TIMEOUT', 10))
+# server side cursors of .iterator() don't work through PgBouncer in transaction pooling mode
+POSTGRES_DB_CONNECTION_URL['DISABLE_SERVER_SIDE_CURSORS'] = config('DB_BEHIND_PGBOUNCER', False, cast=bool)
 
 DATABASES = {
     'default': POSTGRES_DB_CONNECTION_URL
@@ -122,6 +131,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'server_static')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+DB_LOOKUP_CHUNK_SIZE = int(config('DB_LOOKUP_CHUNK_SIZE', 1000))
+
 # Redis
 REDIS_CONNECTION_URL = config('REDIS_DB_CONNECTION_URL')
 DEFAULT_CACHES_REDIS_DB = int(config('DEFAULT_CACHES_REDIS_DB', 1))
@@ -131,9 +142,13 @@ PROJECTS_NOTIFICATION_REDIS_DB = int(config('PROJECTS_NOTIFICATION_REDIS_DB', 10
 PROPOSALS_NOTIFICATION_REDIS_DB = int(config('PROPOSALS_NOTIFICATION_REDIS_DB', 11))
 PRIVATE_PROPOSALS_NOTIFICATION_REDIS_DB = int(config('PRIVATE_PROPOSALS_NOTIFICATION_REDIS_DB', 12))
 AIRTABLE_USER_IDS_REDIS_DB = int(config('AIRTABLE_USER_IDS_REDIS_DB', 13))
+XML_FEEDS_REDIS_DB = int(config('XML_FEEDS_REDIS_DB', 9))
+AIRTABLE_SYNC_REDIS_DB = int(config('AIRTABLE_SYNC_REDIS_DB', 8))
 
 UPWORK_TOKENS_CACHE_NAME = config('UPWORK_TOKENS_CACHE_NAME', 'upwork_tokens')
 AIRTABLE_WEBHOOKS_CACHE_NAME = config('AIRTABLE_WEBHOOKS_CACHE_NAME', 'airtable_webhooks')
+XML_FEEDS_CACHE_NAME = config('XML_FEEDS_CACHE_NAME', 'xml_feeds')
+AIRTABLE_SYNC_CACHE_NAME = config('AIRTABLE_SYNC_CACHE_NAME', 'airtable_sync')
 
 # Notifications caches
 PROJECTS_NOTIFICATION_CACHE = config('PROJECTS_NOTIFICATION_CACHE', 'projects_notification')
@@ -170,6 +185,14 @@ CACHES = {
     AIRTABLE_USER_IDS_CACHE: {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": REDIS_CONNECTION_URL + '/%s' % PRIVATE_PROPOSALS_NOTIFICATION_REDIS_DB
+    },
+    XML_FEEDS_CACHE_NAME: {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": REDIS_CONNECTION_URL + '/%s' % XML_FEEDS_REDIS_DB
+    },
+    AIRTABLE_SYNC_CACHE_NAME: {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": REDIS_CONNECTION_URL + '/%s' % AIRTABLE_SYNC_REDIS_DB
     }
 }
 
@@ -187,6 +210,19 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers.DatabaseScheduler"
 AIRTABLE_TOKEN = config("AIRTABLE_TOKEN", None)
 AIRTABLE_BASE_ID = config("AIRTABLE_BASE_ID", None)
 MAX_RETRIES = int(config('AIRTABLE_RETRIES', 3))
+AIRTABLE_FULL_SYNC_INTERVAL = int(config('AIRTABLE_FULL_SYNC_INTERVAL', 86400))  # default 1 day
+AIRTABLE_SYNC_WATERMARK_OVERLAP = int(config('AIRTABLE_SYNC_WATERMARK_OVERLAP', 60))  # seconds
+AIRTABLE_SNAPSHOT_MAX_AGE = int(config('AIRTABLE_SNAPSHOT_MAX_AGE', 600))  # seconds
+AIRTABLE_SNAPSHOT_READ_GRACE = int(config('AIRTABLE_SNAPSHOT_READ_GRACE', 600))  # seconds
+AIRTABLE_WRITE_LEDGER_TTL = int(config('AIRTABLE_WRITE_LEDGER_TTL', 3600))  # default 1 hour
+AIRTABLE_RATE_LIMIT_PER_SECOND = float(config('AIRTABLE_RATE_LIMIT_PER_SECOND', 5))  # per base
+AIRTABLE_RATE_LIMIT_MIN_PER_SECOND = float(config('AIRTABLE_RATE_LIMIT_MIN_PER_SECOND', 1))
+AIRTABLE_RATE_LIMIT_BURST = int(config('AIRTABLE_RATE_LIMIT_BURST', 5))
+AIRTABLE_RATE_LIMIT_INCREASE_STEP = float(config('AIRTABLE_RATE_LIMIT_INCREASE_STEP', 0.1))
+AIRTABLE_RATE_LIMIT_DECREASE_FACTOR = float(config('AIRTABLE_RATE_LIMIT_DECREASE_FACTOR', 0.5))
+AIRTABLE_RATE_LIMIT_DEFAULT_BLOCK = float(config('AIRTABLE_RATE_LIMIT_DEFAULT_BLOCK', 30))  # Airtable 429 penalty
+AIRTABLE_RATE_LIMIT_READ_RESERVE = int(config('AIRTABLE_RATE_LIMIT_READ_RESERVE', 2))  # tokens kept for writes
+AIRTABLE_RATE_LIMIT_MAX_WAIT = float(config('AIRTABLE_RATE_LIMIT_MAX_WAIT', 10))  # seconds
 
 AIRTABLE_FILTERS_TABLE_VIEW = config('AIRTABLE_FILTERS_TABLE_VIEW', "Grid view")
 FILTERS_TABLE_NAME = config('FILTERS_TABLE_NAME', 'Filters')
@@ -349,7 +385,8 @@ TASKS_HANDLER_MAP = {
             "relevant",
             "created",
         ],
-        "match_field": "url"
+        "match_field": "url",
+        "delete_removed": True  # mirror of the Airtable table, rows removed there are deleted on full sync
     },
     LEADS_TABLE_NAME: {
         "model": 'leadgen_management.models.Leads',
@@ -366,7 +403,8 @@ TASKS_HANDLER_MAP = {
             "assigned_sales",
             "client_name"
         ],
-        "match_field": "_id"
+        "match_field": "_id",
+        "delete_removed": True  # mirror of the Airtable table, rows removed there are deleted on full sync
     },
 }
 
@@ -458,24 +496,43 @@ AIRTABLE_PRIVATE_PROPOSALS_TABLE_FIELDS = {
     "Company Size": "company_size"
 }
 
+# Projects stream between the xml scrapers and the save stage
+PROJECTS_STREAM_NAME = config('PROJECTS_STREAM_NAME', 'projects')
+PROJECTS_STREAM_GROUP = config('PROJECTS_STREAM_GROUP', 'save_projects')
+PROJECTS_STREAM_MAXLEN = int(config('PROJECTS_STREAM_MAXLEN', 50000))
+PROJECTS_STREAM_BATCH_SIZE = int(config('PROJECTS_STREAM_BATCH_SIZE', 100))
+PROJECTS_STREAM_BLOCK_MS = int(config('PROJECTS_STREAM_BLOCK_MS', 5000))
+PROJECTS_STREAM_CLAIM_IDLE_MS = int(config('PROJECTS_STREAM_CLAIM_IDLE_MS', 600000))  # default 10 minutes
+PROJECTS_STREAM_MAX_DELIVERIES = int(config('PROJECTS_STREAM_MAX_DELIVERIES', 5))
+# a failed entry waits this long before its next delivery, doubled for every further one
+PROJECTS_STREAM_RETRY_BACKOFF_MS = int(config('PROJECTS_STREAM_RETRY_BACKOFF_MS', 60000))  # default 1 minute
+# json or msgpack_zstd, entries of any codec are decoded regardless of this setting
+PAYLOAD_CODEC = config('PAYLOAD_CODEC', 'msgpack_zstd')
+
 # UPWORK XML scraping
+XML_FETCH_CONCURRENCY = int(config('XML_FETCH_CONCURRENCY', 20))
+XML_FETCH_TIMEOUT = float(config('XML_FETCH_TIMEOUT', 30))
+XML_FEED_VALIDATORS_TIMEOUT = int(config('XML_FEED_VALIDATORS_TIMEOUT', 86400))  # default 1 day
+XML_FEED_WATERMARK_TIMEOUT = int(config('XML_FEED_WATERMARK_TIMEOUT', 604800))  # default 7 days
+SCRAPE_CYCLE_TIMEOUT = int(config('SCRAPE_CYCLE_TIMEOUT', 3600))
+XML_RATE_LIMIT_PER_SECOND = float(config('XML_RATE_LIMIT_PER_SECOND', 10))
+XML_RATE_LIMIT_MIN_PER_SECOND = float(config('XML_RATE_LIMIT_MIN_PER_SECOND', 0.5))
+XML_RATE_LIMIT_BURST = int(config('XML_RATE_LIMIT_BURST', 10))
+XML_RATE_LIMIT_INCREASE_STEP = float(config('XML_RATE_LIMIT_INCREASE_STEP', 0.1))
+XML_RATE_LIMIT_DECREASE_FACTOR = float(config('XML_RATE_LIMIT_DECREASE_FACTOR', 0.5))
+XML_RATE_LIMIT_DEFAULT_BLOCK = float(config('XML_RATE_LIMIT_DEFAULT_BLOCK', 5))  # seconds without Retry-After
 HEADERS = {
     "accept": "*/*",
     "Accept-Encoding": "gzip, deflate, br",
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                   "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36",
 }
-SUMMARY_TAGS = {
-    "hourly_range": "<b>Hourly Range</b>",
-    "budget": "<b>Budget</b>",
-    "posted_on": "<b>Posted On</b>",
-    "category": "<b>Category</b>",
-    "skills": "<b>Skills</b>",
-}
+SUMMARY_DESCRIPTION_STOP_LABELS = ("Hourly Range", "Budget", "Posted On")
 TEXT_TO_CLEAN = {
     "projects": {
-        "xml_symbols_to_clean": ('quot;', '<br /><br />', '<.*?>', '&.*?;', r'\n&middot;', '- Upwork', 'amp;'),
-        "xml_fields_to_replace": ("<b>Category</b>: ", "<b>Category</b>:", "<b>Country</b>: ", "<b>Country</b>:")
+        "xml_symbols_to_clean": (
+            '&quot;', 'quot;', '<br /><br />', '<.*?>', '&.*?;', '- Upwork', 'amp;'
+        )
     }
 }
 
@@ -485,6 +542,9 @@ FIELDS_BOOLEAN_TYPE = ("Missed", "Approved by HoL", "Answer", "Hired")
 # Proposals scraping
 PROPOSALS_BACK_WATCH_UPDATE_MINUTES = int(config("PROPOSALS_BACK_WATCH_UPDATE_MINUTES", 5))
 UPWORK_SCRAPING_RETRIES = int(config('PROPOSALS_SCRAPING_RETRIES', 3))
+TASKS_PIPELINE_TIMEOUT = int(config('TASKS_PIPELINE_TIMEOUT', 86400))  # default 1 day
+# tasks per second for the mass re-scrape dispatch, 0 is no cap
+PROPOSALS_DISPATCH_RATE_LIMIT = float(config('PROPOSALS_DISPATCH_RATE_LIMIT', 0))
 JOB_UNAVAILABLE_STATUSES = (2, 3,)
 AIRTABLE_PROPOSALS_DONT_UPDATE_FIELDS = ('Created', 'Contract Date', 'Proposal Owner',)
 PROPOSALS_SCRAPING_REQUIRED_FIELDS = (
@@ -1,31 +1,96 @@
+import re
 from json import JSONDecodeError
 from typing import Any
 
 from pyairtable import Api
 
 from services.api.base import BaseAPIClient
+from services.rate_limiter import RedisTokenBucket, RateLimitExceeded, parse_retry_after
+
+
+class AirTableRateGovernor:
+
+    """
+    Requests budget of an Airtable base shared by all workers through the Redis token bucket keyed by base id.
+    Writes have priority over reads: reads leave `read_reserve` tokens in the bucket for the writes.
+    Instead of waiting longer than `max_wait` or sleeping after 429 the caller gets RateLimitExceeded
+    with the seconds to wait before repeating the request.
+    """
+
+    WRITE_METHODS = ('POST', 'PATCH', 'PUT', 'DELETE')
+
+    def __init__(self, bucket: RedisTokenBucket, read_reserve: int = 0, max_wait: float = None):
+        self.bucket = bucket
+        self.read_reserve = read_reserve
+        self.max_wait = max_wait
+
+    def acquire(self, base_id: str, method: str):
+        reserve = 0 if method.upper() in self.WRITE_METHODS else self.read_reserve
+        self.bucket.acquire(base_id, reserve=reserve, max_wait=self.max_wait)
+
+    def feedback(self, base_id: str, status_code: int, retry_after: str = None):
+        if status_code != 429:
+            self.bucket.success(base_id)
+            return
+
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is None:
+            retry_after = self.bucket.default_block
+        self.bucket.penalize(base_id, retry_after=retry_after)
+        raise RateLimitExceeded(key=base_id, retry_after=retry_after)
 
 
 class AirTableClient(Api):
+    # requests are paced by the rate governor instead of the fixed sleeps between pages and batches
+    API_LIMIT = 0
+    BASE_ID_RE = re.compile(r'/v0/(?:meta/)?(?:bases/)?(app\w+)')
+
+    def __init__(self, api_key: str, rate_governor: AirTableRateGovernor = None, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.rate_governor = rate_governor
+
     def schema(self, base_id: str):
         return self._request(method='GET', url=f'https://api.airtable.com/v0/meta/bases/{base_id}/tables')
 
+    def page(self, base_id: str, table_name: str, offset: str = None, **options) -> dict:
+        """ One page of the records with the offset of the next page, when there is one """
+        params = self._options_to_params(**options)
+        if offset:
+            params['offset'] = offset
+        return self._request(method='GET', url=self.get_table_url(base_id, table_name), params=params)
+
+    def _request(self, method: str, url: str, params=None, json_data=None):
+        base_id = self.BASE_ID_RE.search(url)
+        if self.rate_governor is None or base_id is None:
+            return super()._request(method=method, url=url, params=params, json_data=json_data)
+
+        self.rate_governor.acquire(base_id.group(1), method=method)
+        response = self.session.request(method, url, params=params, json=json_data, timeout=self.timeout)
+        self.rate_governor.feedback(base_id.group(1), response.status_code, response.headers.get('Retry-After'))
+        return self._process_response(response)
+
 
 class AirTableWebHooksClient(BaseAPIClient):
     base_url = 'https://api.airtable.com/v0/bases/{}'
 
-    def __init__(self, base_id: str, oauth_token: str):
+    def __init__(self, base_id: str, oauth_token: str, rate_governor: AirTableRateGovernor = None):
         super().__init__()
         self.base_id = base_id
         self.base_url = self.base_url.format(self.base_id) + '/'
         self._oauth_token = oauth_token
+        self.rate_governor = rate_governor
 
     def process_request(self, request) -> None:
+        if self.rate_governor is not None:
+            self.rate_governor.acquire(self.base_id, method=request.method)
+
         request.headers['Authorization'] = 'Bearer ' + self._oauth_token
         request.headers['Content-Type'] = 'application/json'
 
-    @staticmethod
-    def process_response(response) -> dict[str, Any] | list[dict[str, Any]] | None:
+    def process_response(self, response) -> dict[str, Any] | list[dict[str, Any]] | None:
+        if self.rate_governor is not None:
+            self.rate_governor.feedback(self.base_id, response.status_code, response.headers.get('Retry-After'))
+
         if response.status_code in (200, 204):
             try:
                 return response.json()
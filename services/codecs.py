@@ -0,0 +1,79 @@
+import json
+from typing import Any
+
+import msgpack
+import zstandard
+
+
+class PayloadCodec:
+
+    """
+    Encoder of the intermediate payloads. Encoded payload starts with the codec tag byte,
+    so decode_payload reads payloads of any codec no matter which one is configured now.
+    """
+
+    name: str
+    tag: bytes
+
+    def encode(self, payload: Any) -> bytes:
+        return self.tag + self._encode(payload)
+
+    def decode(self, data: bytes) -> Any:
+        return self._decode(data[1:])
+
+    def _encode(self, payload: Any) -> bytes:
+        raise NotImplementedError
+
+    def _decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(PayloadCodec):
+    name = 'json'
+    tag = b'J'
+
+    def _encode(self, payload: Any) -> bytes:
+        return json.dumps(payload, separators=(',', ':')).encode()
+
+    def _decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class MsgpackZstdCodec(PayloadCodec):
+    name = 'msgpack_zstd'
+    tag = b'Z'
+
+    def __init__(self, level: int = 3):
+        self.level = level
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def _encode(self, payload: Any) -> bytes:
+        return self.compressor.compress(msgpack.packb(payload, use_bin_type=True))
+
+    def _decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(self.decompressor.decompress(data), raw=False)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, MsgpackZstdCodec)}
+_codecs: dict[str, PayloadCodec] = {}
+
+
+def get_codec(name: str) -> PayloadCodec:
+    """ Codec instance is built once per process """
+    if name not in CODECS:
+        raise ValueError('Unknown payload codec %s, available: %s' % (name, ', '.join(CODECS)))
+    if name not in _codecs:
+        _codecs[name] = CODECS[name]()
+    return _codecs[name]
+
+
+def decode_payload(data: bytes | str) -> Any:
+    """ Decoding payload by its tag byte, untagged data is plain json written before the codecs were added """
+    if isinstance(data, str):
+        data = data.encode()
+
+    for name, codec in CODECS.items():
+        if data[:1] == codec.tag:
+            return get_codec(name).decode(data)
+    return json.loads(data)
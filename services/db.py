@@ -0,0 +1,143 @@
+import io
+import uuid
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+
+def copy_value(value) -> str:
+    """ Python value to the COPY text format """
+    match value:
+        case None:
+            return r'\N'
+        case bool():
+            return 't' if value else 'f'
+        case datetime.datetime() | datetime.date() | datetime.time():
+            return value.isoformat()
+        case int() | float() | Decimal():
+            return str(value)
+        case _:
+            return (
+                str(value)
+                .replace('\\', '\\\\')
+                .replace('\t', '\\t')
+                .replace('\n', '\\n')
+                .replace('\r', '\\r')
+            )
+
+
+def copy_rows(objs: list, fields: list) -> io.StringIO:
+    buffer = io.StringIO()
+    for obj in objs:
+        values = (field.get_db_prep_save(field.pre_save(obj, add=True), connection) for field in fields)
+        buffer.write('\t'.join(copy_value(value) for value in values))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_to_temp_table(cursor, model, objs: list, fields: list) -> str:
+    """ Streaming objs into the temp table dropped on commit, returns quoted temp table name """
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    temp_table = connection.ops.quote_name('copy_%s' % uuid.uuid4().hex)
+
+    cursor.execute(f'CREATE TEMP TABLE {temp_table} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA')
+    cursor.cursor.copy_expert(f'COPY {temp_table} ({columns}) FROM STDIN', copy_rows(objs=objs, fields=fields))
+    return temp_table
+
+
+def copy_insert(model, objs: list, conflict_field: str = 'url') -> list:
+    """
+    Bulk ingest through COPY into a temp table and INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Rows which conflict on `conflict_field` with saved rows or with each other are skipped instead of failing
+    the whole batch, only actually inserted objs are returned with primary keys set.
+    """
+    if not objs:
+        return []
+
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(meta.db_table)
+    conflict_column = connection.ops.quote_name(meta.get_field(conflict_field).column)
+    pk_column = connection.ops.quote_name(meta.pk.column)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        temp_table = copy_to_temp_table(cursor=cursor, model=model, objs=objs, fields=fields)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table} '
+            f'ON CONFLICT ({conflict_column}) DO NOTHING RETURNING {pk_column}, {conflict_column}'
+        )
+        inserted = {conflict_value: pk for pk, conflict_value in cursor.fetchall()}
+
+    inserted_objs = []
+    for obj in objs:
+        pk = inserted.pop(getattr(obj, conflict_field), None)
+        if pk is None:
+            continue
+
+        obj.pk = pk
+        obj._state.adding = False
+        obj._state.db = connection.alias
+        inserted_objs.append(obj)
+    return inserted_objs
+
+
+def copy_upsert(model, objs: list, match_field: str, update_fields: list[str]) -> dict[str, int]:
+    """
+    Bulk upsert which writes only real changes: rows are updated only when `update_fields` are distinct
+    from the saved ones. ON CONFLICT is used when `match_field` is unique, otherwise UPDATE ... FROM and
+    INSERT ... WHERE NOT EXISTS do the same. Returns inserted, updated and unchanged rows counts.
+    """
+    if not objs:
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    table = quote(meta.db_table)
+    match_field = meta.get_field(match_field)
+    match_column = quote(match_field.column)
+    update_columns = [quote(meta.get_field(field).column) for field in update_fields]
+    target_values = ', '.join('target.%s' % column for column in update_columns)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        temp_table = copy_to_temp_table(cursor=cursor, model=model, objs=objs, fields=fields)
+
+        if match_field.unique:
+            set_clause = ', '.join('%s = EXCLUDED.%s' % (column, column) for column in update_columns)
+            excluded_values = ', '.join('EXCLUDED.%s' % column for column in update_columns)
+            cursor.execute(
+                f'INSERT INTO {table} AS target ({columns}) SELECT {columns} FROM {temp_table} '
+                f'ON CONFLICT ({match_column}) DO UPDATE SET {set_clause} '
+                f'WHERE ({target_values}) IS DISTINCT FROM ({excluded_values}) '
+                f'RETURNING (target.xmax = 0)'
+            )
+            # xmax is 0 only for the freshly inserted row versions
+            written = [inserted for inserted, in cursor.fetchall()]
+            inserted_count = sum(written)
+            updated_count = len(written) - inserted_count
+        else:
+            set_clause = ', '.join('%s = source.%s' % (column, column) for column in update_columns)
+            source_values = ', '.join('source.%s' % column for column in update_columns)
+            cursor.execute(
+                f'UPDATE {table} AS target SET {set_clause} FROM {temp_table} AS source '
+                f'WHERE target.{match_column} = source.{match_column} '
+                f'AND ({target_values}) IS DISTINCT FROM ({source_values})'
+            )
+            updated_count = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table} AS source WHERE NOT EXISTS '
+                f'(SELECT 1 FROM {table} AS target WHERE target.{match_column} = source.{match_column})'
+            )
+            inserted_count = cursor.rowcount
+
+    return {
+        'inserted': inserted_count,
+        'updated': updated_count,
+        # several saved rows may share not unique match value
+        'unchanged': max(0, len(objs) - inserted_count - updated_count)
+    }
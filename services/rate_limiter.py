@@ -0,0 +1,145 @@
+import time
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from redis import Redis
+
+
+class RateLimitExceeded(Exception):
+
+    """ Backpressure for the caller: the key is throttled, the request can be repeated after retry_after seconds """
+
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__('Rate limit of %s exceeded, retry after %.1f seconds' % (key, retry_after))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """ Retry-After is either delay seconds or HTTP date """
+    if not value:
+        return
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0., (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return
+
+
+class RedisTokenBucket:
+
+    """
+    Token bucket shared by all workers through Redis, one bucket per key (host).
+    The refill rate adapts AIMD way: it grows by `increase_step` on every successful request up to `rate`
+    and is multiplied by `decrease_factor` on throttling, which also blocks the key for Retry-After seconds.
+    """
+
+    # KEYS[1] - bucket key
+    # ARGV - max rate, burst, ttl ms, reserve (tokens which must stay in the bucket for the higher priority)
+    # returns milliseconds to wait, 0 when the token is taken
+    acquire_script = """
+        local now_parts = redis.call('TIME')
+        local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+        local max_rate, burst, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local reserve = math.min(tonumber(ARGV[4]) or 0, burst - 1)
+        local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'blocked_until')
+        local rate = tonumber(data[3]) or max_rate
+        local blocked_until = tonumber(data[4]) or 0
+
+        if now < blocked_until then
+            return blocked_until - now
+        end
+
+        local tokens = tonumber(data[1]) or burst
+        local ts = tonumber(data[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+        local wait = 0
+        if tokens >= 1 + reserve then
+            tokens = tokens - 1
+        else
+            wait = math.ceil((1 + reserve - tokens) * 1000 / rate)
+        end
+
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now, 'rate', tostring(rate))
+        redis.call('PEXPIRE', KEYS[1], ttl)
+        return wait
+    """
+
+    # KEYS[1] - bucket key
+    # ARGV - max rate, min rate, increase step, decrease factor, block ms (-1 on success), ttl ms
+    feedback_script = """
+        local now_parts = redis.call('TIME')
+        local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+        local max_rate, min_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local increase_step, decrease_factor = tonumber(ARGV[3]), tonumber(ARGV[4])
+        local block_ms, ttl = tonumber(ARGV[5]), tonumber(ARGV[6])
+        local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or max_rate
+
+        if block_ms < 0 then
+            rate = math.min(max_rate, rate + increase_step)
+        else
+            rate = math.max(min_rate, rate * decrease_factor)
+            local blocked_until = math.max(tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0, now + block_ms)
+            -- the bucket starts refilling only after the block, so there is no burst right after it
+            redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', blocked_until, 'blocked_until', blocked_until)
+        end
+
+        redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+        redis.call('PEXPIRE', KEYS[1], ttl)
+        return tostring(rate)
+    """
+
+    def __init__(self, redis: Redis, prefix: str, rate: float, burst: int, min_rate: float, increase_step: float,
+                 decrease_factor: float, default_block: float, ttl: int = 3600):
+        self.redis = redis
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.default_block = default_block
+        self.ttl_ms = ttl * 1000
+        self._acquire = redis.register_script(self.acquire_script)
+        self._feedback = redis.register_script(self.feedback_script)
+
+    def _key(self, key: str) -> str:
+        return '%s_%s' % (self.prefix, key)
+
+    def try_acquire(self, key: str, reserve: int = 0) -> float:
+        """
+        Seconds to wait before the next try, 0 when the token is taken.
+        Lower priority callers pass reserve, so they leave that many tokens to the callers without reserve.
+        """
+        return self._acquire(keys=[self._key(key)], args=[self.rate, self.burst, self.ttl_ms, reserve]) / 1000
+
+    def acquire(self, key: str, reserve: int = 0, max_wait: float = None):
+        """ Waiting for the token, RateLimitExceeded is raised instead of waiting longer than max_wait seconds """
+        waited = 0
+        while wait := self.try_acquire(key, reserve=reserve):
+            if max_wait is not None and waited + wait > max_wait:
+                raise RateLimitExceeded(key=key, retry_after=wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def async_acquire(self, key: str):
+        """ Waiting for the token without blocking the event loop, the Redis call runs in a thread """
+        while wait := await asyncio.to_thread(self.try_acquire, key):
+            await asyncio.sleep(wait)
+
+    def success(self, key: str):
+        self._send_feedback(key=key, block_ms=-1)
+
+    def penalize(self, key: str, retry_after: float = None):
+        """ Slowing the key down and blocking it for Retry-After or default_block seconds """
+        block = retry_after if retry_after is not None else self.default_block
+        self._send_feedback(key=key, block_ms=int(block * 1000))
+
+    def _send_feedback(self, key: str, block_ms: int):
+        self._feedback(
+            keys=[self._key(key)],
+            args=[self.rate, self.min_rate, self.increase_step, self.decrease_factor, block_ms, self.ttl_ms]
+        )
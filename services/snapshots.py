@@ -0,0 +1,104 @@
+import uuid
+import logging
+from typing import Callable, Iterator
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+from services.codecs import get_codec, decode_payload
+
+
+logger = logging.getLogger('leadgen_management')
+
+
+class SnapshotReadError(Exception):
+    pass
+
+
+class AirTableSnapshots:
+
+    """
+    Shared snapshots of the whole Airtable tables in Redis, stored page by page with the payload codec.
+    Every table has a version, invalidation bumps it, so a snapshot being built from the older version
+    is never published. Snapshots are read for AIRTABLE_SNAPSHOT_MAX_AGE seconds, their pages are kept
+    AIRTABLE_SNAPSHOT_READ_GRACE seconds longer, so readers which started on the older version can finish it.
+    """
+
+    def __init__(self, max_age: int = None):
+        self.redis = get_redis_connection(settings.AIRTABLE_SYNC_CACHE_NAME)
+        self.codec = get_codec(settings.PAYLOAD_CODEC)
+        self.max_age = max_age or settings.AIRTABLE_SNAPSHOT_MAX_AGE
+        self.pages_ttl = self.max_age + settings.AIRTABLE_SNAPSHOT_READ_GRACE
+
+    @staticmethod
+    def _version_key(table_name: str) -> str:
+        return 'snapshot_version_%s' % table_name
+
+    @staticmethod
+    def _pages_key(table_name: str, version: int) -> str:
+        return 'snapshot_pages_%s_%s' % (table_name, version)
+
+    @staticmethod
+    def _fresh_key(table_name: str, version: int) -> str:
+        return 'snapshot_fresh_%s_%s' % (table_name, version)
+
+    def version(self, table_name: str) -> int:
+        return int(self.redis.get(self._version_key(table_name)) or 0)
+
+    def invalidate(self, table_name: str):
+        """ New readers skip the current snapshot, its pages stay until they expire for the readers in progress """
+        self.redis.incr(self._version_key(table_name))
+
+    def iter_pages(self, table_name: str, fetch_pages: Callable[[], Iterator[list[dict]]]) -> Iterator[list[dict]]:
+        """ Pages of the table snapshot, the snapshot is built from fetch_pages() when there is no fresh one """
+        version = self.version(table_name)
+        pages_key = self._pages_key(table_name, version)
+
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.exists(self._fresh_key(table_name, version))
+        pipeline.llen(pages_key)
+        fresh, pages_count = pipeline.execute()
+        if fresh and pages_count:
+            for index in range(pages_count):
+                page = self.redis.lindex(pages_key, index)
+                if page is None:
+                    # read longer than the grace period, pages of another snapshot can not be mixed with the read ones
+                    raise SnapshotReadError('Snapshot of %s expired while reading' % table_name)
+                yield decode_payload(page)
+            return
+
+        building_key = '%s_%s' % (pages_key, uuid.uuid4().hex)
+        built = False
+        try:
+            for page in fetch_pages():
+                pipeline = self.redis.pipeline(transaction=False)
+                pipeline.rpush(building_key, self.codec.encode(page))
+                pipeline.expire(building_key, self.pages_ttl)
+                pipeline.execute()
+                built = True
+                yield page
+
+            # an empty table is not cached, there is nothing to save on reading it again
+            if built:
+                self._publish(table_name=table_name, version=version, building_key=building_key)
+        finally:
+            self.redis.delete(building_key)
+
+    def _publish(self, table_name: str, version: int, building_key: str):
+        """ The built snapshot replaces the table one only when the table was not invalidated meanwhile """
+        with self.redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(self._version_key(table_name))
+                if int(pipeline.get(self._version_key(table_name)) or 0) != version:
+                    logger.debug('Snapshot of %s was invalidated while building' % table_name)
+                    return
+
+                pages_key = self._pages_key(table_name, version)
+                pipeline.multi()
+                pipeline.rename(building_key, pages_key)
+                pipeline.expire(pages_key, self.pages_ttl)
+                pipeline.set(self._fresh_key(table_name, version), 1, ex=self.max_age)
+                pipeline.execute()
+            except WatchError:
+                logger.debug('Snapshot of %s was invalidated while building' % table_name)
@@ -0,0 +1,89 @@
+import json
+import hashlib
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+class AirTableWriteLedger:
+
+    """
+    Hashes of the field values last pushed to an Airtable table, one Redis hash per record.
+    Records are keyed by the Airtable record id for the updates and by the natural key (URL) for the creates.
+    Entries are committed only after their batch is written, so a retried write resumes with the unwritten records.
+    The ledger trusts that Airtable still holds the pushed values, so the records seen changed or deleted in Airtable
+    (webhooks, incremental sync) are forgotten and every entry lives only AIRTABLE_WRITE_LEDGER_TTL seconds:
+    manual edits of the tables without webhooks are overwritten and deleted records are created again after it.
+    """
+
+    RECORD_ID_FIELD = '_record_id'
+
+    def __init__(self, table_name: str, ttl: int = None):
+        self.redis = get_redis_connection(settings.AIRTABLE_SYNC_CACHE_NAME)
+        self.table_name = table_name
+        self.ttl = ttl or settings.AIRTABLE_WRITE_LEDGER_TTL
+
+    def _key(self, record_key: str) -> str:
+        return 'write_ledger_%s_%s' % (self.table_name, record_key)
+
+    @staticmethod
+    def value_hash(value) -> str:
+        data = json.dumps(value, sort_keys=True, default=str).encode()
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    def _pushed(self, record_keys: list[str]) -> list[dict[bytes, bytes]]:
+        pipeline = self.redis.pipeline(transaction=False)
+        for record_key in record_keys:
+            pipeline.hgetall(self._key(record_key))
+        return pipeline.execute()
+
+    def diff(self, records: dict[str, dict]) -> dict[str, dict]:
+        """ Only the fields changed since the last push, records without changes are dropped """
+        changed_records = {}
+        for (record_key, fields), pushed in zip(records.items(), self._pushed(list(records))):
+            changed_fields = {
+                field: value for field, value in fields.items()
+                if pushed.get(field.encode()) != self.value_hash(value).encode()
+            }
+            if changed_fields:
+                changed_records[record_key] = changed_fields
+        return changed_records
+
+    def new(self, records: dict[str, dict]) -> dict[str, dict]:
+        """ Records which were never pushed, for the creates which must not be repeated """
+        return {
+            record_key: fields
+            for (record_key, fields), pushed in zip(records.items(), self._pushed(list(records)))
+            if not pushed
+        }
+
+    def commit(self, records: dict[str, dict], record_ids: dict[str, str] = None):
+        """ Remembering the pushed fields, with the Airtable ids of the created records keyed by natural key """
+        record_ids = record_ids or {}
+        pipeline = self.redis.pipeline(transaction=False)
+        for record_key, fields in records.items():
+            if not fields:
+                continue
+            key = self._key(record_key)
+            mapping = {field: self.value_hash(value) for field, value in fields.items()}
+            if record_key in record_ids:
+                mapping[self.RECORD_ID_FIELD] = record_ids[record_key]
+            pipeline.hset(key, mapping=mapping)
+            pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    def forget(self, record_keys):
+        """ Records changed in Airtable, their next push is compared with Airtable only """
+        keys = [self._key(record_key) for record_key in record_keys]
+        if keys:
+            self.redis.delete(*keys)
+
+    def record_ids(self, record_keys: list[str]) -> dict[str, str]:
+        """ Airtable ids of the records created by their natural keys """
+        pipeline = self.redis.pipeline(transaction=False)
+        for record_key in record_keys:
+            pipeline.hget(self._key(record_key), self.RECORD_ID_FIELD)
+        return {
+            record_key: record_id.decode()
+            for record_key, record_id in zip(record_keys, pipeline.execute()) if record_id
+        }